@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy.signal import butter, freqz
+
+pytest.importorskip("pyaudio")
+
+from toysynth.synthesis.signal import ButterworthTable
+
+SAMPLE_RATE = 48000
+NYQUIST = SAMPLE_RATE / 2
+
+@pytest.fixture
+def table():
+    return ButterworthTable(2, SAMPLE_RATE)
+
+def magnitude_db(b, a, frequencies):
+    (_, response) = freqz(b, a, worN=frequencies, fs=SAMPLE_RATE)
+    return 20 * np.log10(np.abs(response))
+
+def test_cc_cutoffs_are_exact_entries(table):
+    for cc in (0, 1, 64, 127):
+        cutoff = 2 ** (ButterworthTable.MIN_OCTAVE + cc * (ButterworthTable.MAX_OCTAVE - ButterworthTable.MIN_OCTAVE) / ButterworthTable.CC_STEPS)
+        (b, a) = table.coefficients(cutoff)
+        (direct_b, direct_a) = butter(2, cutoff / NYQUIST)
+        np.testing.assert_allclose(b, direct_b, rtol=1e-9)
+        np.testing.assert_allclose(a, direct_a, rtol=1e-9, atol=1e-12)
+
+@pytest.mark.parametrize("cutoff", [23.7, 440.0, 1000.0, 3333.3, 12345.6])
+def test_interpolated_cutoff_responds_like_a_direct_design(table, cutoff):
+    (b, a) = table.coefficients(cutoff)
+    (direct_b, direct_a) = butter(2, cutoff / NYQUIST)
+    frequencies = np.geomspace(10, 0.99 * NYQUIST, 200)
+    direct = magnitude_db(direct_b, direct_a, frequencies)
+    audible = direct > -40
+    np.testing.assert_allclose(magnitude_db(b, a, frequencies)[audible], direct[audible], atol=0.01)
+    # Still a stable 2nd order section: both poles inside the unit circle
+    assert np.all(np.abs(np.roots(a)) < 1.0)
+
+def test_cutoffs_outside_the_grid_are_clamped(table):
+    (low_b, low_a) = table.coefficients(1.0)
+    np.testing.assert_array_equal(low_b, table.b[0])
+    np.testing.assert_array_equal(low_a, table.a[0])
+    (high_b, high_a) = table.coefficients(10 * SAMPLE_RATE)
+    np.testing.assert_array_equal(high_b, table.b[-1])
+    np.testing.assert_array_equal(high_a, table.a[-1])
+
+def test_smooth_cutoff_glides_in_octaves():
+    # One time constant covers 1 - 1/e of the distance in octaves, and a cutoff within 0.1% snaps to the target
+    glided = ButterworthTable.smooth_cutoff(1000.0, 4000.0, 480, 480)
+    assert np.log2(glided / 1000.0) == pytest.approx(2 * (1 - np.exp(-1)))
+    assert ButterworthTable.smooth_cutoff(4000.0, 4002.0, 480, 480) == 4002.0
+    assert ButterworthTable.smooth_cutoff(1000.0, 4000.0, 480, 0) == 4000.0
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyaudio")
+
+from toysynth.synthesis.signal import DelayLine
+
+FRAMES_PER_CHUNK = 8
+
+def ramp(start, num_frames=FRAMES_PER_CHUNK):
+    return np.arange(start, start + num_frames, dtype=np.float32)
+
+def test_whole_delay_reads_what_was_written():
+    line = DelayLine(20, FRAMES_PER_CHUNK)
+    # Frame n of the signal is n. 10 frames of delay means the next chunk starts with frame 24 - 10 = 14
+    for chunk in range(3):
+        line.write(ramp(chunk * FRAMES_PER_CHUNK))
+    out = np.zeros(FRAMES_PER_CHUNK, dtype=np.float32)
+    np.testing.assert_array_equal(line.read(10, out), ramp(14))
+
+def test_reads_and_writes_wrap_around_the_end_of_the_line():
+    # A length that isn't a multiple of the chunk, so chunks straddle the end of the line
+    line = DelayLine(13, FRAMES_PER_CHUNK)
+    out = np.zeros(FRAMES_PER_CHUNK, dtype=np.float32)
+    for chunk in range(10):
+        start = chunk * FRAMES_PER_CHUNK
+        if start >= 12:
+            np.testing.assert_array_equal(line.read(12, out), ramp(start - 12))
+        line.write(ramp(start))
+    assert line.write_index == (10 * FRAMES_PER_CHUNK) % 13
+
+def test_fractional_delay_interpolates_between_frames():
+    line = DelayLine(32, FRAMES_PER_CHUNK)
+    for chunk in range(3):
+        line.write(ramp(chunk * FRAMES_PER_CHUNK))
+    out = np.zeros(FRAMES_PER_CHUNK, dtype=np.float32)
+    # On a ramp, linear interpolation is exact: 10.25 frames back from frame 24 is 13.75
+    np.testing.assert_allclose(line.read(10.25, out), ramp(13.75), rtol=0, atol=1e-5)
+
+def test_delay_is_clamped_to_the_chunk_and_line_length():
+    line = DelayLine(16, FRAMES_PER_CHUNK)
+    assert line.clamp_delay(2, FRAMES_PER_CHUNK) == FRAMES_PER_CHUNK
+    assert line.clamp_delay(100, FRAMES_PER_CHUNK) == 15
+
+def test_taps_are_summed():
+    line = DelayLine(32, FRAMES_PER_CHUNK)
+    for chunk in range(3):
+        line.write(ramp(chunk * FRAMES_PER_CHUNK))
+    out = np.zeros(FRAMES_PER_CHUNK, dtype=np.float32)
+    line.read_taps([(8, 1.0), (16, 0.5)], out)
+    np.testing.assert_allclose(out, ramp(16) + 0.5 * ramp(8))
+
+@pytest.mark.parametrize("rows", [np.array([0, 2]), slice(0, 2)])
+def test_rows_only_touch_their_channels(rows):
+    line = DelayLine(20, FRAMES_PER_CHUNK, num_channels=3)
+    channels = np.arange(3)[rows]
+    for chunk in range(3):
+        block = np.stack([ramp(chunk * FRAMES_PER_CHUNK) * (channel + 1) for channel in channels])
+        line.write(block, rows)
+    untouched = [channel for channel in range(3) if channel not in channels]
+    assert not line.buffer[untouched].any()
+
+    out = np.zeros((len(channels), FRAMES_PER_CHUNK), dtype=np.float32)
+    line.read(9.5, out, rows)
+    expected = np.stack([ramp(14.5) * (channel + 1) for channel in channels])
+    np.testing.assert_allclose(out, expected, rtol=0, atol=1e-5)
@@ -0,0 +1,53 @@
+import mido
+import pytest
+
+from toysynth.communication import Event, EventType
+
+def fields(event):
+    return (event.type, event.channel, event.data1, event.data2, event.timestamp)
+
+@pytest.mark.parametrize("event", [
+    Event(EventType.NOTE_ON, 3, 60, 127),
+    Event(EventType.NOTE_OFF, 15, 0, 0),
+    Event(EventType.CONTROL_CHANGE, 0, 74, 127),
+    Event(EventType.PROGRAM_CHANGE, 9, 0, 0),
+])
+def test_text_form_round_trips(event):
+    parsed = Event.parse(str(event), timestamp=1.5)
+    assert fields(parsed) == fields(event)[:4] + (1.5,)
+
+def test_text_form_sets_note_velocities():
+    # The text form has no velocity: note ons are played at full velocity, note offs at 0
+    assert Event.parse("note_on -n 60 -c 0").data2 == 127
+    assert Event.parse("note_off -n 60 -c 0").data2 == 0
+
+@pytest.mark.parametrize("text", [
+    "exit",
+    "",
+    "note_on -n 60",
+    "note_on -n sixty -c 0",
+    "note_on -n 128 -c 0",
+    "note_on -n 60 -c 16",
+    "control_change -c 0 -n 74 -v -1",
+    "program_change -c 0 -n 60 -v 1",
+])
+def test_parse_rejects_commands_and_bad_values(text):
+    assert Event.parse(text) is None
+
+@pytest.mark.parametrize("msg, expected", [
+    (mido.Message("note_on", channel=2, note=64, velocity=100), (EventType.NOTE_ON, 2, 64, 100)),
+    (mido.Message("note_on", channel=2, note=64, velocity=0), (EventType.NOTE_OFF, 2, 64, 0)),
+    (mido.Message("note_off", channel=1, note=64, velocity=40), (EventType.NOTE_OFF, 1, 64, 40)),
+    (mido.Message("control_change", channel=0, control=74, value=12), (EventType.CONTROL_CHANGE, 0, 74, 12)),
+    (mido.Message("program_change", channel=9, program=5), (EventType.PROGRAM_CHANGE, 9, 5, 0)),
+])
+def test_from_mido(msg, expected):
+    event = Event.from_mido(msg, timestamp=2.0)
+    assert fields(event) == expected + (2.0,)
+    # The text form of a MIDI event parses back to the same event, apart from note velocities
+    parsed = Event.parse(str(event))
+    assert (parsed.type, parsed.channel, parsed.data1) == expected[:3]
+
+def test_from_mido_ignores_unhandled_messages():
+    assert Event.from_mido(mido.Message("pitchwheel", channel=0, pitch=100)) is None
+    assert Event.from_mido(mido.Message("clock")) is None
@@ -0,0 +1,51 @@
+from copy import deepcopy
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyaudio")
+
+from toysynth.communication import Mailbox
+from toysynth.synthesis import Synthesizer
+
+SAMPLE_RATE = 48000
+FRAMES_PER_CHUNK = 256
+
+def make_chains():
+    """
+    Two copies of the synth's default voice chain: one rendered through its ExecutionPlan, one through the tree of iterators
+    """
+    synth = Synthesizer(Mailbox(), SAMPLE_RATE, FRAMES_PER_CHUNK, num_voices=1)
+    planned = iter(deepcopy(synth.signal_chain_prototype))
+    tree = iter(deepcopy(synth.signal_chain_prototype))
+    tree.compiled = False
+    return (planned, tree)
+
+def test_plan_renders_like_the_iterator_tree():
+    (planned, tree) = make_chains()
+    assert planned.plan is not None and tree.plan is None
+
+    # chunk index -> what happens before it's rendered
+    script = {
+        0: lambda chain: chain.note_on(440.0),
+        10: lambda chain: chain.set_filter_cutoff(600.0),
+        20: lambda chain: chain.set_delay_time(0.01),
+        30: lambda chain: chain.set_filter_cutoff(5000.0),
+        40: lambda chain: chain.note_off(),
+        50: lambda chain: chain.note_on(220.0),
+        60: lambda chain: chain.note_off(),
+    }
+    for chunk in range(120):
+        for chain in (planned, tree):
+            if chunk in script:
+                script[chunk](chain)
+        # Render some chunks in pieces, like the synth does when an event is due inside a chunk
+        pieces = (FRAMES_PER_CHUNK,) if chunk % 7 else (100, FRAMES_PER_CHUNK - 100)
+        for num_frames in pieces:
+            planned_out = np.zeros(num_frames, dtype=np.float32)
+            tree_out = np.zeros(num_frames, dtype=np.float32)
+            planned_props = planned.process(planned_out)
+            tree_props = tree.process(tree_out)
+            assert np.array_equal(planned_out, tree_out), f"chunk {chunk}"
+            assert planned_props.get("silent", False) == tree_props.get("silent", False)
+    assert np.abs(planned_out).max() == 0.0 # the second note's release and delay tail have ended
@@ -0,0 +1,72 @@
+import tracemalloc
+
+import pytest
+
+pyaudio = pytest.importorskip("pyaudio")
+
+from toysynth.communication import Mailbox
+from toysynth.playback import PyAudioStreamPlayer, RenderAheadBuffer
+from toysynth.synthesis import Synthesizer
+
+SAMPLE_RATE = 48000
+FRAMES_PER_CHUNK = 4096
+WARM_UP_CHUNKS = 20
+MEASURED_CHUNKS = 200
+# A callback may allocate small objects (array views, NumPy scalars, props dicts), but nothing the size of a chunk.
+# A float32 chunk is 16 KB; the four voice block of the batched renders is 64 KB.
+MAX_RENDER_PEAK = FRAMES_PER_CHUNK * 4 // 2
+# Handing out a chunk the render ahead buffer already rendered only copies it into the buffer's output chunk
+MAX_PLAYBACK_PEAK = 1024
+
+def make_synth(engine):
+    synth = Synthesizer(Mailbox(), SAMPLE_RATE, FRAMES_PER_CHUNK, num_voices=4, engine=engine)
+    for note in (60, 64, 67):
+        synth.note_on_poly(note, 0)
+    return synth
+
+def callback_peaks(play_chunk, prepare=lambda: None):
+    """
+    Play WARM_UP_CHUNKS chunks, then returns the peak number of bytes allocated during each of MEASURED_CHUNKS more.
+    prepare() runs before every chunk, outside of the measurement.
+    """
+    for _ in range(WARM_UP_CHUNKS):
+        prepare()
+        play_chunk()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(MEASURED_CHUNKS):
+            prepare()
+            (before, _) = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            play_chunk()
+            (_, peak) = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+@pytest.mark.parametrize("engine", [Synthesizer.Engine.CHAIN, Synthesizer.Engine.VOICE_BANK])
+def test_generator_callback_does_not_allocate_chunks(engine):
+    synth = make_synth(engine)
+    player = PyAudioStreamPlayer(SAMPLE_RATE, FRAMES_PER_CHUNK, synth.generator())
+
+    def play_chunk():
+        (frames, flag) = player.audio_callback(None, FRAMES_PER_CHUNK, {}, 0)
+        assert flag == pyaudio.paContinue and len(frames) == FRAMES_PER_CHUNK
+
+    assert max(callback_peaks(play_chunk)) < MAX_RENDER_PEAK
+
+@pytest.mark.parametrize("engine", [Synthesizer.Engine.CHAIN, Synthesizer.Engine.VOICE_BANK])
+def test_render_ahead_callback_does_not_allocate(engine):
+    synth = make_synth(engine)
+    buffer = RenderAheadBuffer(synth.generator(), FRAMES_PER_CHUNK)
+    player = PyAudioStreamPlayer(SAMPLE_RATE, FRAMES_PER_CHUNK, buffer)
+
+    def play_chunk():
+        (frames, flag) = player.audio_callback(None, FRAMES_PER_CHUNK, {}, 0)
+        assert flag == pyaudio.paContinue and frames is buffer._out
+
+    # The chunks are rendered on this thread between the callbacks, so only the callback is measured
+    assert max(callback_peaks(play_chunk, prepare=buffer.prefill)) < MAX_PLAYBACK_PEAK
+    assert buffer.underruns == 0
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyaudio")
+
+from toysynth.playback import PolyphaseResampler
+
+FREQUENCY = 1000.0
+AMPLITUDE = 0.5
+NUM_OUTPUT_FRAMES = 48000
+
+class SineSource():
+    """
+    An endless sine wave in chunks of a fixed size, that counts the frames it was asked for
+    """
+    def __init__(self, sample_rate, frames_per_chunk):
+        self.sample_rate = sample_rate
+        self.frames_per_chunk = frames_per_chunk
+        self.frames = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        times = (self.frames + np.arange(self.frames_per_chunk)) / self.sample_rate
+        self.frames += self.frames_per_chunk
+        return (AMPLITUDE * np.sin(2 * np.pi * FREQUENCY * times)).astype(np.float32)
+
+# Chunk sizes that don't divide into each other or into the rate ratio (160/147 and 147/160)
+@pytest.mark.parametrize("input_rate, output_rate, input_chunk, output_chunk", [
+    (44100, 48000, 256, 300),
+    (48000, 44100, 300, 256),
+])
+def test_resampled_sine(input_rate, output_rate, input_chunk, output_chunk):
+    source = SineSource(input_rate, input_chunk)
+    resampler = PolyphaseResampler(source, input_rate, output_rate, output_chunk)
+
+    chunks = []
+    for _ in range(NUM_OUTPUT_FRAMES // output_chunk):
+        chunk = next(resampler)
+        assert chunk.dtype == np.float32 and len(chunk) == output_chunk
+        chunks.append(chunk.copy()) # the resampler reuses its output chunk
+    out = np.concatenate(chunks)
+
+    # The input is only pulled as far as the output needs it: the frames under the output so far,
+    # plus the filter's length, rounded up to whole input chunks
+    input_frames = len(out) * input_rate / output_rate
+    assert input_frames <= source.frames <= input_frames + resampler.num_taps + input_chunk
+
+    # Skip the filter's delay. The window keeps the sine's energy close to its frequency
+    steady = out[resampler.num_taps * 2:]
+    spectrum = np.abs(np.fft.rfft(steady * np.hanning(len(steady))))
+    frequencies = np.fft.rfftfreq(len(steady), 1 / output_rate)
+    peak_magnitude = spectrum.max()
+    assert frequencies[np.argmax(spectrum)] == pytest.approx(FREQUENCY, abs=output_rate / len(steady))
+    assert np.abs(steady).max() == pytest.approx(AMPLITUDE, rel=0.01)
+    # Nothing but the sine: no images or aliases above -80 dB
+    assert spectrum[np.abs(frequencies - FREQUENCY) > 50].max() < peak_magnitude * 1e-4
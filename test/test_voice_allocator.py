@@ -0,0 +1,122 @@
+import pytest
+
+pytest.importorskip("pyaudio")
+
+from toysynth.communication import Mailbox
+from toysynth.synthesis import Synthesizer, VoiceAllocator
+
+class FakeVoice():
+    """
+    The part of a Voice the allocator looks at: whether it's still sounding, and its envelope level
+    """
+    def __init__(self, index):
+        self.index = index
+        self.active = False
+        self.amp = 0.0
+
+    def __repr__(self):
+        return f"FakeVoice({self.index})"
+
+def make_allocator(num_voices=3, steal_policy=VoiceAllocator.StealPolicy.RELEASED_FIRST):
+    voices = [FakeVoice(i) for i in range(num_voices)]
+    return (VoiceAllocator(voices, steal_policy), voices)
+
+def play(allocator, note, channel=0):
+    voice = allocator.note_on(note, channel)
+    voice.active = True
+    return voice
+
+def test_free_voices_are_handed_out_in_order():
+    (allocator, voices) = make_allocator()
+    assert [play(allocator, note) for note in (60, 62, 64)] == voices
+    assert len(allocator.free) == 0
+    assert allocator.voices_stolen == 0
+
+def test_held_note_is_retriggered_on_its_voice():
+    (allocator, voices) = make_allocator()
+    voice = play(allocator, 60)
+    play(allocator, 62)
+    assert allocator.note_on(60, 0) is voice
+    assert list(allocator.held) == [voices[1], voice] # the retriggered note is now the newest
+
+def test_notes_are_keyed_by_note_and_channel():
+    (allocator, _) = make_allocator()
+    # Keys built by concatenating digits would make these two the same note
+    first = play(allocator, 1, 12)
+    second = play(allocator, 11, 2)
+    assert first is not second
+    assert allocator.note_off(1, 12) is first
+    assert allocator.note_off(11, 2) is second
+    assert allocator.note_off(1, 2) is None
+
+def test_released_voice_is_reused_once_silent():
+    (allocator, voices) = make_allocator(num_voices=1)
+    voice = play(allocator, 60)
+    assert allocator.note_off(60, 0) is voice
+    voice.active = False # its release finished
+    assert play(allocator, 62) is voice
+    assert allocator.voices_stolen == 0
+    assert list(allocator.notes) == [(62, 0)]
+
+def test_released_first_steals_the_voice_released_the_longest_ago():
+    (allocator, voices) = make_allocator()
+    for note in (60, 62, 64):
+        play(allocator, note)
+    allocator.note_off(64, 0)
+    allocator.note_off(62, 0)
+    assert play(allocator, 65) is voices[2]
+    assert allocator.voices_stolen == 1
+    assert list(allocator.released) == [voices[1]]
+
+def test_released_first_steals_the_oldest_voice_when_every_key_is_down():
+    (allocator, voices) = make_allocator()
+    for note in (60, 62, 64):
+        play(allocator, note)
+    assert play(allocator, 65) is voices[0]
+    assert allocator.note_off(60, 0) is None # the stolen note no longer has a voice
+    assert allocator.note_off(65, 0) is voices[0]
+
+def test_oldest_steals_the_first_triggered_voice():
+    (allocator, voices) = make_allocator(steal_policy=VoiceAllocator.StealPolicy.OLDEST)
+    for note in (60, 62, 64):
+        play(allocator, note)
+    allocator.note_off(64, 0)
+    assert play(allocator, 65) is voices[0]
+    assert play(allocator, 67) is voices[1]
+    assert allocator.voices_stolen == 2
+
+def test_quietest_steals_the_lowest_voice():
+    (allocator, voices) = make_allocator(steal_policy=VoiceAllocator.StealPolicy.QUIETEST)
+    for (note, amp) in ((60, 0.8), (62, 0.1), (64, 0.5)):
+        play(allocator, note).amp = amp
+    assert play(allocator, 65) is voices[1]
+    assert allocator.note_off(62, 0) is None
+
+def test_steal_policy_is_parsed_from_its_name():
+    (allocator, _) = make_allocator()
+    allocator.steal_policy = "quietest"
+    assert allocator.steal_policy == VoiceAllocator.StealPolicy.QUIETEST
+    allocator.steal_policy = "loudest"
+    assert allocator.steal_policy == VoiceAllocator.StealPolicy.RELEASED_FIRST
+
+def test_resync_frees_silent_voices_and_releases_sounding_ones():
+    (allocator, voices) = make_allocator()
+    # Played without the allocator, like in mono mode
+    voices[1].active = True
+    allocator.resync()
+    assert list(allocator.free) == [voices[0], voices[2]]
+    assert list(allocator.released) == [voices[1]]
+    assert len(allocator.held) == 0 and len(allocator.notes) == 0
+    # The free voices go first, then the ringing one is stolen
+    assert [play(allocator, note) for note in (60, 62, 64)] == [voices[0], voices[2], voices[1]]
+
+def test_mode_switch_resyncs_the_allocator():
+    synth = Synthesizer(Mailbox(), 48000, 256, num_voices=4)
+    synth.mode = Synthesizer.Mode.MONO
+    synth.note_on(60, 2) # mono mode plays channel 2 on voice 2
+    synth.mode = Synthesizer.Mode.POLY
+    allocator = synth.voice_allocator
+    assert list(allocator.released) == [synth.voices[2]]
+    assert synth.voices[2] not in allocator.free
+    synth.note_on(64, 0)
+    assert allocator.notes[(64, 0)] is synth.voices[0]
@@ -1,11 +1,13 @@
 import os
 import logging
 import sys
+import argparse
 
 from .configuration import SettingsReader
 from .communication import MQTTListener, Mailbox
-from .midi import MidiPlayer, MidiListener, get_available_controllers
-from .synthesis import Synthesizer
+from .midi import MidiPlayer, MidiInputService, get_available_controllers
+from .synthesis import Synthesizer, OfflineRenderer
+from .synthesis.signal import ComponentProfiler, ButterworthTable
 
 if __name__ == "__main__":
     log = logging.getLogger(__name__)
@@ -47,15 +49,49 @@ if __name__ == "__main__":
     # Set up the command queues
     main_mailbox = Mailbox()
     synthesizer_mailbox = Mailbox()
-    midi_player_listener_mailbox = Mailbox()
+    midi_input_mailbox = Mailbox()
     midi_player_mailbox = Mailbox()
 
     # Set up the Synth
     sample_rate = int(settings.data['synthesis']['sample_rate'])
     frames_per_chunk = int(settings.data['synthesis']['frames_per_chunk'])
+    # The voices render at the internal rate, in chunks as long as the device's
+    internal_sample_rate = int(settings.data['synthesis'].get('internal_sample_rate', 0)) or sample_rate
+    internal_frames_per_chunk = max(1, round(frames_per_chunk * internal_sample_rate / sample_rate))
+    # Offline render mode: python -m toysynth render <in.mid> <out.wav>
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        parser = argparse.ArgumentParser(prog="python -m toysynth render", description="Render a MIDI file to a WAV file without an audio device")
+        parser.add_argument("midi_file", help="path of the MIDI file to render")
+        parser.add_argument("wav_file", help="path of the WAV file to write")
+        parser.add_argument("--engine", choices=[engine.name.lower() for engine in Synthesizer.Engine], default="voice_bank")
+        parser.add_argument("--voices", type=int, default=8, help="number of synth voices")
+        parser.add_argument("--tail", type=float, default=2.0, help="seconds to keep rendering after the last event")
+        parser.add_argument("--workers", type=int, default=0, help="render worker processes for the process_pool engine. 0 uses one per core")
+        parser.add_argument("--threads", type=int, default=0, help="render threads for the chain engine. 0 or 1 renders on one thread")
+        args = parser.parse_args(sys.argv[2:])
+
+        renderer = OfflineRenderer(internal_sample_rate, internal_frames_per_chunk, num_voices=args.voices, engine=Synthesizer.Engine[args.engine.upper()], tail_length=args.tail,
+                                   render_workers=args.workers, render_threads=args.threads, output_sample_rate=sample_rate, output_frames_per_chunk=frames_per_chunk)
+        renderer.render(args.midi_file, args.wav_file)
+        sys.exit(0)
 
     # toy_synth = Controller(synthesizer_mailbox, sample_rate, frames_per_chunk)
-    toy_synth = Synthesizer(synthesizer_mailbox, sample_rate, frames_per_chunk)
+    # Only the live synth caches its filter tables, so offline renders don't write to the cache dir
+    if filter_cache_dir := settings.data['synthesis'].get('filter_cache_dir'):
+        ButterworthTable.cache_dir = os.path.expanduser(filter_cache_dir)
+    render_ahead_chunks = int(settings.data['synthesis'].get('render_ahead_chunks', 0))
+    batch_filters = bool(settings.data['synthesis'].get('batch_filters', True))
+    steal_policy = settings.data['synthesis'].get('voice_steal_policy', "released_first")
+    engine = Synthesizer.Engine[settings.data['synthesis'].get('engine', "chain").upper()]
+    render_workers = int(settings.data['synthesis'].get('render_workers', 0))
+    render_threads = int(settings.data['synthesis'].get('render_threads', 0))
+    thread_min_frames = int(settings.data['synthesis'].get('thread_min_frames', 2048))
+    toy_synth = Synthesizer(synthesizer_mailbox, internal_sample_rate, internal_frames_per_chunk, engine=engine, render_ahead_chunks=render_ahead_chunks, batch_filters=batch_filters, steal_policy=steal_policy,
+                            render_workers=render_workers, render_threads=render_threads, thread_min_frames=thread_min_frames, output_sample_rate=sample_rate, output_frames_per_chunk=frames_per_chunk)
+    profiler = None
+    if settings.data['synthesis'].get('profile_components', False):
+        profiler = ComponentProfiler()
+        toy_synth.enable_instrumentation(profiler)
     
     # Open the MQTT listener
     mqtt_host = settings.data['mqtt']['host']
@@ -67,25 +103,19 @@ if __name__ == "__main__":
     # Create the MIDI threads
     #   Open the MIDI file player
     port_name = settings.data['midi']['player_port_name']
-    midi_player_listener = MidiListener(midi_player_listener_mailbox, synthesizer_mailbox, port_name)
     midi_player = MidiPlayer(midi_player_mailbox, port_name)
 
-    #   Open listeners for any pre-configured controllers
+    #   One input service reads the player port and any pre-configured controllers, including ones plugged in later
     auto_attach_list = settings.data['midi']['auto_attach']
-    available_controllers = get_available_controllers()
-    log.debug(f"Available Controllers: {available_controllers}")
-    controllers = [controller for controller in auto_attach_list if controller in available_controllers]
-    listener_mailboxes = [Mailbox() for _ in controllers]
-    midi_listeners = [MidiListener(listener_mailboxes[i], synthesizer_mailbox, controllers[i]) for i in range(len(controllers))]
+    log.debug(f"Available Controllers: {get_available_controllers()}")
+    midi_input = MidiInputService(midi_input_mailbox, synthesizer_mailbox, [port_name], auto_attach=auto_attach_list)
 
     try:
         # Start the threads
         toy_synth.start()
         mqtt_listener.start()
         midi_player.start()
-        midi_player_listener.start()
-        for listener in midi_listeners:
-            listener.start()
+        midi_input.start()
 
         # main thread loop
         should_run = True
@@ -103,15 +133,13 @@ if __name__ == "__main__":
     # Send the exit command to the various threads
     synthesizer_mailbox.put("exit")
     midi_player_mailbox.put("exit")
-    midi_player_listener_mailbox.put("exit")
-    for mailbox in listener_mailboxes:
-        mailbox.put("exit")
+    midi_input_mailbox.put("exit")
 
     toy_synth.join()
+    if profiler is not None:
+        profiler.log_report()
     mqtt_listener.stop()
     mqtt_listener.join()
     midi_player.join()
-    midi_player_listener.join()
-    for listener in midi_listeners:
-        listener.join()
+    midi_input.join()
     sys.exit(0)
\ No newline at end of file
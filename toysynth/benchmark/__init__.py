@@ -0,0 +1 @@
+from .benchmark import Benchmark
@@ -0,0 +1,32 @@
+import argparse
+import logging
+
+from toysynth.synthesis import Synthesizer
+from .benchmark import Benchmark
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s [%(levelname)s] %(module)s [%(funcName)s]: %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+    # The synth logs its signal chain every time one is built, which drowns out the results
+    logging.getLogger("toysynth.synthesis.synthesizer").setLevel(logging.WARNING)
+
+    parser = argparse.ArgumentParser(prog="python -m toysynth.benchmark", description="Benchmark the toy synth signal components, chain and synthesizer")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[44100])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[128, 512, 1024])
+    parser.add_argument("--voices", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--engines", choices=[engine.name.lower() for engine in Synthesizer.Engine], nargs="+", default=[engine.name.lower() for engine in Synthesizer.Engine])
+    parser.add_argument("--chunks", type=int, default=200, help="number of chunks to time for every result")
+    parser.add_argument("--skip", choices=["components", "chain", "synthesizer"], nargs="*", default=[])
+    parser.add_argument("--output", default="benchmark_results.json", help="path of the JSON results file to write")
+    parser.add_argument("--compare", help="path of a previous results file to compare against")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.sample_rates, args.chunk_sizes, args.voices, num_chunks=args.chunks)
+    benchmark.run(components="components" not in args.skip,
+                  chain="chain" not in args.skip,
+                  synthesizer="synthesizer" not in args.skip,
+                  engines=[Synthesizer.Engine[engine.upper()] for engine in args.engines])
+    benchmark.write(args.output)
+    if args.compare:
+        benchmark.compare(args.compare)
@@ -0,0 +1,179 @@
+import logging
+import json
+import os
+import platform
+import subprocess
+import time
+from copy import deepcopy
+
+import numpy as np
+import scipy
+
+from toysynth.communication import Mailbox
+import toysynth.synthesis.signal as signal
+from toysynth.synthesis import Synthesizer
+
+class BufferSource(signal.Generator):
+    """
+    A source that returns the same precomputed chunk of noise every time.
+    Processing components are fed from this so their timings don't include the cost of generating the input.
+    """
+    def __init__(self, sample_rate, frames_per_chunk, name="BufferSource"):
+        super().__init__(sample_rate, frames_per_chunk, signal_type=signal.SignalType.WAVE, name=name)
+        rng = np.random.default_rng(0)
+        self._chunk = rng.uniform(-0.5, 0.5, self.frames_per_chunk).astype(np.float32)
+        self._props["amp"] = 0.5
+
+    def __iter__(self):
+        return self
+
+    def process(self, out):
+        self._props["amp"] = 0.5
+        np.copyto(out, self._chunk)
+        return self._props
+
+    def __deepcopy__(self, memo):
+        return BufferSource(self.sample_rate, self.frames_per_chunk)
+
+
+class Benchmark():
+    """
+    Times the signal components, the default signal chain and the full synthesizer without an audio device.
+    Every result reports chunks per second and the real time factor (render time / audio time, so anything
+    below 1.0 renders faster than real time).
+    """
+    def __init__(self, sample_rates=[44100], chunk_sizes=[128, 512, 1024], voice_counts=[1, 8, 32], num_chunks=200, warmup_chunks=10):
+        self.log = logging.getLogger(__name__)
+        self.sample_rates = sample_rates
+        self.chunk_sizes = chunk_sizes
+        self.voice_counts = voice_counts
+        self.num_chunks = num_chunks
+        self.warmup_chunks = warmup_chunks
+        self.results = []
+
+    def time_iterator(self, iterator, sample_rate, frames_per_chunk):
+        for _ in range(self.warmup_chunks):
+            next(iterator)
+        start_time = time.perf_counter()
+        for _ in range(self.num_chunks):
+            next(iterator)
+        elapsed = time.perf_counter() - start_time
+        audio_duration = self.num_chunks * frames_per_chunk / sample_rate
+        return {
+            "chunks": self.num_chunks,
+            "seconds": elapsed,
+            "chunks_per_second": self.num_chunks / elapsed,
+            "real_time_factor": elapsed / audio_duration,
+        }
+
+    def record(self, kind, name, sample_rate, frames_per_chunk, timing, **extra):
+        result = {"kind": kind, "name": name, "sample_rate": sample_rate, "frames_per_chunk": frames_per_chunk}
+        result.update(extra)
+        result.update(timing)
+        self.results.append(result)
+        extra_str = "".join(f" {key}={value}" for (key, value) in extra.items())
+        self.log.info(f"{kind:<11} {name:<40} sr={sample_rate:<6} chunk={frames_per_chunk:<5}{extra_str} {timing['chunks_per_second']:>10.1f} chunks/s  rtf={timing['real_time_factor']:.4f}")
+        return result
+
+    def get_components(self, sample_rate, frames_per_chunk):
+        """
+        Returns a dict of name -> component to time, set up the way they are used in the synth
+        """
+        def source():
+            return BufferSource(sample_rate, frames_per_chunk)
+
+        components = {
+            "SinWaveOscillator": signal.SinWaveOscillator(sample_rate, frames_per_chunk),
+            "SquareWaveOscillator": signal.SquareWaveOscillator(sample_rate, frames_per_chunk),
+            "SawtoothWaveOscillator": signal.SawtoothWaveOscillator(sample_rate, frames_per_chunk),
+            "TriangleWaveOscillator": signal.TriangleWaveOscillator(sample_rate, frames_per_chunk),
+            "NoiseGenerator": signal.NoiseGenerator(sample_rate, frames_per_chunk),
+            "ConstantValueGenerator": signal.ConstantValueGenerator(sample_rate, frames_per_chunk),
+            "BufferSource": source(),
+            "Gain": signal.Gain(sample_rate, frames_per_chunk, signal.SignalType.WAVE, subcomponents=[source()]),
+            "Mixer": signal.Mixer(sample_rate, frames_per_chunk, [source(), source()]),
+            "AdsrEnvelope": signal.AdsrEnvelope(sample_rate, frames_per_chunk, source()),
+            "Delay": signal.Delay(sample_rate, frames_per_chunk, [source()], delay_buffer_length=4.0),
+            "LowPassFilter": signal.LowPassFilter(sample_rate, frames_per_chunk, source(), 8000.0),
+        }
+        for component in components.values():
+            if isinstance(component, signal.Oscillator):
+                component.frequency = 440.0
+            component.active = True
+        return components
+
+    def bench_components(self, sample_rate, frames_per_chunk):
+        for (name, component) in self.get_components(sample_rate, frames_per_chunk).items():
+            timing = self.time_iterator(iter(component), sample_rate, frames_per_chunk)
+            self.record("component", name, sample_rate, frames_per_chunk, timing)
+
+    def bench_chain(self, sample_rate, frames_per_chunk):
+        synth = Synthesizer(Mailbox(), sample_rate, frames_per_chunk, num_voices=1)
+        chain = deepcopy(synth.signal_chain_prototype)
+        iter(chain)
+        chain.note_on(440.0)
+        timing = self.time_iterator(chain, sample_rate, frames_per_chunk)
+        self.record("chain", "Synthesizer.setup_signal_chain", sample_rate, frames_per_chunk, timing)
+
+    def bench_synthesizer(self, sample_rate, frames_per_chunk, num_voices, engine):
+        synth = Synthesizer(Mailbox(), sample_rate, frames_per_chunk, num_voices=num_voices, engine=engine)
+        try:
+            for i in range(num_voices):
+                synth.note_on(48 + (i % 48), 0)
+            timing = self.time_iterator(synth.generator(), sample_rate, frames_per_chunk)
+        finally:
+            synth.close() # stops the process pool's workers and frees its shared memory
+        self.record("synthesizer", "Synthesizer.generator", sample_rate, frames_per_chunk, timing, voices=num_voices, engine=engine.name.lower())
+
+    def run(self, components=True, chain=True, synthesizer=True, engines=list(Synthesizer.Engine)):
+        self.results = []
+        for sample_rate in self.sample_rates:
+            for frames_per_chunk in self.chunk_sizes:
+                if components:
+                    self.bench_components(sample_rate, frames_per_chunk)
+                if chain:
+                    self.bench_chain(sample_rate, frames_per_chunk)
+                if synthesizer:
+                    for engine in engines:
+                        for num_voices in self.voice_counts:
+                            self.bench_synthesizer(sample_rate, frames_per_chunk, num_voices, engine)
+        return self.results
+
+    def get_metadata(self):
+        try:
+            commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.realpath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "num_chunks": self.num_chunks,
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump({"metadata": self.get_metadata(), "results": self.results}, f, indent=2)
+        self.log.info(f"Wrote {len(self.results)} results to {path}")
+
+    @staticmethod
+    def result_key(result):
+        return (result["kind"], result["name"], result["sample_rate"], result["frames_per_chunk"], result.get("voices"), result.get("engine"))
+
+    def compare(self, path):
+        """
+        Log the change in chunks/s of every result relative to a previous results file
+        """
+        with open(path, "r") as f:
+            baseline = {Benchmark.result_key(result): result for result in json.load(f)["results"]}
+
+        for result in self.results:
+            if (old := baseline.get(Benchmark.result_key(result))) is None:
+                continue
+            change = (result["chunks_per_second"] / old["chunks_per_second"] - 1) * 100
+            extra_str = "".join(f" {key}={result[key]}" for key in ("voices", "engine") if key in result)
+            self.log.info(f"{result['name']:<40} sr={result['sample_rate']:<6} chunk={result['frames_per_chunk']:<5}{extra_str} {change:+6.1f}% chunks/s")
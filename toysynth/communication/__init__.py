@@ -1,2 +1,3 @@
 from .mqtt_listener import MQTTListener
-from .mailbox import Mailbox
\ No newline at end of file
+from .mailbox import Mailbox
+from .event import Event, EventType
@@ -0,0 +1,100 @@
+from enum import IntEnum
+
+import toysynth.communication.message_builder as mb
+
+class EventType(IntEnum):
+    NOTE_ON = 0
+    NOTE_OFF = 1
+    CONTROL_CHANGE = 2
+    PROGRAM_CHANGE = 3
+
+class Event():
+    """
+    A compact, typed controller event, passed from the MIDI and MQTT listeners to the synth as is.
+
+    data1 and data2 follow MIDI: note and velocity for notes, controller and value for control changes,
+    and program number for program changes.
+    timestamp is the perf_counter time the event was received, or None if it should be timed on arrival.
+
+    The text form (e.g. "note_on -n 60 -c 0") is only an adapter for MQTT users: parse() reads it and str() writes it.
+    """
+    __slots__ = ("type", "channel", "data1", "data2", "timestamp")
+
+    MAX_CHANNEL = 15
+    MAX_DATA = 127
+
+    def __init__(self, type: EventType, channel=0, data1=0, data2=0, timestamp=None):
+        self.type = type
+        self.channel = channel
+        self.data1 = data1
+        self.data2 = data2
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"Event({self.type.name}, channel={self.channel}, data1={self.data1}, data2={self.data2}, timestamp={self.timestamp})"
+
+    def __str__(self):
+        match self.type:
+            case EventType.NOTE_ON:
+                return str(mb.builder().note_on().with_note(self.data1).on_channel(self.channel))
+            case EventType.NOTE_OFF:
+                return str(mb.builder().note_off().with_note(self.data1).on_channel(self.channel))
+            case EventType.CONTROL_CHANGE:
+                return str(mb.builder().control_change().on_channel(self.channel).with_control_num(self.data1).with_value(self.data2))
+            case EventType.PROGRAM_CHANGE:
+                return str(mb.builder().program_change().on_channel(self.channel).with_program_num(self.data1))
+
+    @staticmethod
+    def from_mido(msg, timestamp=None):
+        """
+        Translate a mido message into an Event.
+        Returns None if the message type isn't handled by the synth.
+        """
+        match msg.type:
+            case "note_on" if msg.velocity == 0:
+                # A note on with zero velocity is the running status way of saying note off
+                return Event(EventType.NOTE_OFF, msg.channel, msg.note, 0, timestamp)
+            case "note_on":
+                return Event(EventType.NOTE_ON, msg.channel, msg.note, msg.velocity, timestamp)
+            case "note_off":
+                return Event(EventType.NOTE_OFF, msg.channel, msg.note, msg.velocity, timestamp)
+            case "control_change":
+                return Event(EventType.CONTROL_CHANGE, msg.channel, msg.control, msg.value, timestamp)
+            case "program_change":
+                return Event(EventType.PROGRAM_CHANGE, msg.channel, msg.program, 0, timestamp)
+            case _:
+                return None
+
+    @staticmethod
+    def parse(message, timestamp=None):
+        """
+        Parse the text form of an event.
+        Returns None if the text isn't an event, e.g. a command like "exit", or if a channel or data value
+        is out of the MIDI range, since the synth indexes its lookup tables with them.
+        """
+        try:
+            match message.split():
+                case ["note_on", "-n", note, "-c", channel]:
+                    return Event(EventType.NOTE_ON, Event.channel_value(channel), Event.data_value(note), 127, timestamp)
+                case ["note_off", "-n", note, "-c", channel]:
+                    return Event(EventType.NOTE_OFF, Event.channel_value(channel), Event.data_value(note), 0, timestamp)
+                case ["control_change", "-c", channel, "-n", cc_num, "-v", control_val]:
+                    return Event(EventType.CONTROL_CHANGE, Event.channel_value(channel), Event.data_value(cc_num), Event.data_value(control_val), timestamp)
+                case ["program_change", "-c", channel, "-n", program_num]:
+                    return Event(EventType.PROGRAM_CHANGE, Event.channel_value(channel), Event.data_value(program_num), 0, timestamp)
+                case _:
+                    return None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def channel_value(text):
+        if not 0 <= (value := int(text)) <= Event.MAX_CHANNEL:
+            raise ValueError(f"Channel {value} is out of range")
+        return value
+
+    @staticmethod
+    def data_value(text):
+        if not 0 <= (value := int(text)) <= Event.MAX_DATA:
+            raise ValueError(f"Data value {value} is out of range")
+        return value
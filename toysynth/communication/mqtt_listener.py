@@ -5,6 +5,8 @@ import logging
 
 import paho.mqtt.client as mqtt
 
+from .event import Event
+
 
 class MQTTListener(threading.Thread):
     def __init__(self, host, port, topics, mailboxes):
@@ -72,7 +74,7 @@ class MQTTListener(threading.Thread):
                 self.log_message(msg)
             case "toy/synth/test/command":
                 if topic in self.mailboxes:
-                    self.mailboxes[topic].put(MQTTListener.decode_payload(msg))
+                    self.mailboxes[topic].put(MQTTListener.decode_event(msg))
             case _:
                 self.log.debug(f"Matched default case.")
                 if topic in self.mailboxes:
@@ -83,6 +85,15 @@ class MQTTListener(threading.Thread):
     def decode_payload(msg):
         return str(msg.payload.decode("utf-8"))
 
+    @staticmethod
+    def decode_event(msg):
+        """
+        Decode a synth command payload into an Event if it's the text form of one, or leave it as text (e.g. "exit")
+        """
+        payload = MQTTListener.decode_payload(msg)
+        event = Event.parse(payload, timestamp=time.perf_counter())
+        return event if event is not None else payload
+
     def log_message(self, msg):
         """
         message should have topic and payload
@@ -1,6 +1,6 @@
 import mido
 
-from .midi_listener import MidiListener
+from .midi_input_service import MidiInputService
 from .midi_player import MidiPlayer
 
 def get_available_controllers():
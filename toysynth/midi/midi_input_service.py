@@ -0,0 +1,85 @@
+import logging
+import threading
+import queue
+from time import perf_counter
+
+import mido
+
+from toysynth.communication import Mailbox, Event
+
+class MidiInputService(threading.Thread):
+    """
+    Reads every MIDI input port from one place and merges their events into the synth's mailbox.
+
+    Ports are opened with callbacks, so no thread blocks in receive() and nothing waits on an idle port.
+    Every event is stamped with its receive time, which keeps the merged stream in order on the synth's clock.
+    The service thread itself only waits on its mailbox: it rescans the available ports every rescan_interval
+    seconds to open auto attach controllers that were plugged in and to close ports that went away,
+    and it shuts down as soon as it gets "exit".
+    """
+    def __init__(self, mailbox: Mailbox, controller_mailbox: Mailbox, port_names, auto_attach=[], rescan_interval=1.0):
+        super().__init__(name="MidiInputService")
+        self.log = logging.getLogger(__name__)
+        self.mailbox = mailbox
+        self.controller_mailbox = controller_mailbox
+        self.port_names = list(port_names) # always opened, e.g. the MIDI player's virtual port
+        self.auto_attach = list(auto_attach) # opened whenever they're available
+        self.rescan_interval = rescan_interval
+        self.ports = {}
+
+    def open_port(self, port_name):
+        try:
+            self.ports[port_name] = mido.open_input(port_name, callback=lambda msg: self.on_message(port_name, msg))
+            self.log.info(f"Opened port {port_name}")
+        except (IOError, OSError) as e:
+            self.log.error(f"Couldn't open port {port_name}: {e}")
+
+    def close_port(self, port_name):
+        if (port := self.ports.pop(port_name, None)) is not None:
+            port.close()
+            self.log.info(f"Closed port {port_name}")
+
+    def on_message(self, port_name, msg):
+        """
+        Called from the MIDI backend's thread for every message on any port
+        """
+        if event := Event.from_mido(msg, timestamp=perf_counter()):
+            self.controller_mailbox.put(event)
+        elif msg.type == "stop":
+            self.log.info(f"Received midi STOP message on {port_name}")
+        else:
+            self.log.info(f"Matched unknown MIDI message on {port_name}: {msg}")
+
+    def rescan(self):
+        """
+        Open the ports that should be open and are available, and close the ones that disappeared
+        """
+        available = set(mido.get_input_names())
+        for port_name in self.port_names + self.auto_attach:
+            if port_name not in self.ports and port_name in available:
+                self.open_port(port_name)
+        for port_name in list(self.ports):
+            if port_name not in available:
+                self.log.info(f"Port {port_name} went away")
+                self.close_port(port_name)
+
+    def run(self):
+        self.rescan()
+        should_run = True
+        while should_run:
+            try:
+                mail = self.mailbox.get(timeout=self.rescan_interval)
+            except queue.Empty:
+                self.rescan()
+                continue
+
+            match mail.split():
+                case ['exit']:
+                    self.log.info("Got exit command.")
+                    should_run = False
+                case _:
+                    self.log.info(f"Matched unknown mailbox message: {mail}")
+
+        for port_name in list(self.ports):
+            self.close_port(port_name)
+        return
@@ -1 +1,3 @@
-from .pyaudio_stream_player import PyAudioStreamPlayer
\ No newline at end of file
+from .pyaudio_stream_player import PyAudioStreamPlayer
+from .render_ahead_buffer import RenderAheadBuffer
+from .polyphase_resampler import PolyphaseResampler
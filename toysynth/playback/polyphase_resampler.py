@@ -0,0 +1,117 @@
+import logging
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin
+
+class PolyphaseResampler():
+    """
+    Resamples a stream of chunks from one sample rate to another, so the synth can render at a different rate
+    than the audio device runs at.
+
+    Like the RenderAheadBuffer it's an iterator over a source iterator, meant to sit between the synth's generator
+    and a StreamPlayer. Every next() returns frames_per_chunk frames at the output rate, and pulls as many input
+    chunks as it needs for them. The returned chunk stays intact until the next call to next().
+
+    The rates are reduced to a ratio up / down. The output is the input upsampled by up, low pass filtered and
+    decimated by down, but only the filter taps that land on input frames are ever computed: the filter is split
+    into up phases, and every output frame is one dot product of the phase it falls on with the input frames under it.
+    The filter is taps_per_phase input frames long (down / up times longer when decimating, so the cutoff stays as sharp)
+    and delays the output by half of that. Filter banks are designed once per ratio and shared by every resampler.
+    The phases of a chunk's frames only depend on the phase its first frame falls on, and a chunk can only start on a few
+    of them, so the taps of every frame in a chunk are gathered once per starting phase and reused.
+    """
+    filter_banks = {} # (up, down, taps_per_phase) -> (up x taps) filter bank
+    MAX_CACHED_START_PHASES = 8
+
+    def __init__(self, source, input_sample_rate, output_sample_rate, frames_per_chunk, taps_per_phase=32):
+        self.log = logging.getLogger(__name__)
+        self.source = source
+        divisor = gcd(input_sample_rate, output_sample_rate)
+        self.up = output_sample_rate // divisor
+        self.down = input_sample_rate // divisor
+        self.frames_per_chunk = frames_per_chunk
+        self.bank = PolyphaseResampler.get_filter_bank(self.up, self.down, taps_per_phase)
+        self.num_taps = self.bank.shape[1]
+
+        # The input frames that haven't been used up yet. The first num_taps - 1 are the history of the filter
+        self._input = np.zeros(self.num_taps - 1 + 2 * ((frames_per_chunk * self.down) // self.up + 1), np.float32)
+        self._input_windows = sliding_window_view(self._input, self.num_taps) # row i is the num_taps frames starting at i
+        self._filled = self.num_taps - 1
+        self._time = 0 # the position of the next output frame, in upsampled frames from the start of _input
+        self._offsets = np.arange(frames_per_chunk, dtype=np.int64) * self.down
+        self._times = np.zeros(frames_per_chunk, np.int64)
+        self._indexes = np.zeros(frames_per_chunk, np.int64)
+        self._phases = np.zeros(frames_per_chunk, np.int64)
+        self._windows = np.zeros((frames_per_chunk, self.num_taps), np.float32)
+        self._taps = np.zeros((frames_per_chunk, self.num_taps), np.float32)
+        self._chunk_taps = {} # the phase of a chunk's first frame -> the taps of every frame in the chunk
+        # The first frame of the next chunk is (frames_per_chunk * down) % up phases further along
+        self.num_start_phases = self.up // gcd(self.up, (frames_per_chunk * self.down) % self.up)
+        self._out = np.zeros(frames_per_chunk, np.float32)
+        self.log.info(f"Resampling {input_sample_rate} Hz to {output_sample_rate} Hz ({self.up}/{self.down}) with {self.up} phases of {self.num_taps} taps")
+
+    @staticmethod
+    def get_filter_bank(up, down, taps_per_phase):
+        """
+        Returns the (up x taps) polyphase bank of a low pass filter that cuts off just below the lower of the two
+        Nyquist frequencies. Row p holds the taps of phase p, reversed so they line up with the input frames oldest first.
+        """
+        key = (up, down, taps_per_phase)
+        if (bank := PolyphaseResampler.filter_banks.get(key)) is None:
+            num_taps = -(-taps_per_phase * max(up, down) // up)
+            prototype = firwin(up * num_taps, 0.9 / max(up, down), window=("kaiser", 8.0)) * up
+            # Tap k of phase p is prototype[p + k * up]
+            bank = np.ascontiguousarray(prototype.reshape(num_taps, up).T[:, ::-1], dtype=np.float32)
+            PolyphaseResampler.filter_banks[key] = bank
+        return bank
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        np.add(self._offsets, self._time, out=self._times)
+        np.floor_divide(self._times, self.up, out=self._indexes)
+        np.remainder(self._times, self.up, out=self._phases)
+        while self._filled < self._indexes[-1] + self.num_taps:
+            self.pull()
+
+        # Output frame n is the dot product of the num_taps input frames starting at _indexes[n] with phase _phases[n]
+        np.take(self._input_windows, self._indexes, axis=0, out=self._windows)
+        np.einsum("ij,ij->i", self._windows, self.get_chunk_taps(), out=self._out)
+        np.clip(self._out, -1.0, 1.0, out=self._out) # the filter can ring past a clipped input
+
+        # Drop the input frames no later output frame reads
+        self._time += self.frames_per_chunk * self.down
+        used = self._time // self.up
+        self._input[:self._filled - used] = self._input[used:self._filled]
+        self._filled -= used
+        self._time -= used * self.up
+        return self._out
+
+    def get_chunk_taps(self):
+        """
+        Returns the taps of every frame of this chunk, cached if a chunk can only start on a few phases
+        """
+        if self.num_start_phases > PolyphaseResampler.MAX_CACHED_START_PHASES:
+            return np.take(self.bank, self._phases, axis=0, out=self._taps)
+        start_phase = self._time % self.up
+        if (taps := self._chunk_taps.get(start_phase)) is None:
+            taps = self.bank[self._phases]
+            self._chunk_taps[start_phase] = taps
+        return taps
+
+    def pull(self):
+        """
+        Append the next chunk of the source to the input
+        """
+        chunk = next(self.source)
+        if self._filled + len(chunk) > len(self._input):
+            # Only happens for the first chunks, until the buffer fits the source's chunk size
+            grown = np.zeros(self._filled + 2 * len(chunk), np.float32)
+            grown[:self._filled] = self._input[:self._filled]
+            self._input = grown
+            self._input_windows = sliding_window_view(self._input, self.num_taps)
+        self._input[self._filled:self._filled + len(chunk)] = chunk
+        self._filled += len(chunk)
@@ -1,5 +1,6 @@
+import logging
 import pyaudio
-import time
+from time import perf_counter
 
 from .stream_player import StreamPlayer
 
@@ -9,7 +10,7 @@ class PyAudioStreamPlayer(StreamPlayer):
         self.pyaudio_interface = pyaudio.PyAudio()
         self._output_stream = None
         self._chunk_duration = self.frames_per_chunk / self.sample_rate
-        self.last_time = time.time()
+        self.frames_played = 0 # the stream's sample clock
 
     def play(self):
         if self._output_stream is None:
@@ -32,14 +33,20 @@ class PyAudioStreamPlayer(StreamPlayer):
 
     def audio_callback(self, in_data, frame_count, time_info, status):
         """
-        The audio callback should just have to call next() on the input delegate
+        The audio callback should just have to call next() on the input delegate.
+        The chunk is returned as the float32 array itself: PyAudio reads it through the buffer protocol, so nothing is
+        allocated or copied here. It can't be a memoryview, because PyAudio only accepts buffers without a release hook.
+        Render times are only measured when debug logging is on, so the callback doesn't read the clock otherwise.
         """
-        start_time = time.time()
+        self.frames_played += frame_count
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return (next(self.input_delegate), pyaudio.paContinue)
+
+        start_time = perf_counter()
         frames = next(self.input_delegate)
-        end_time = time.time()
-        duration = end_time - start_time
+        duration = perf_counter() - start_time
         if duration > self._chunk_duration:
-            self.log.debug(f"Processing chunk took {duration}s")
+            self.log.debug(f"Processing chunk at frame {self.frames_played} took {duration}s")
         return (frames, pyaudio.paContinue)
     
     def is_active(self):
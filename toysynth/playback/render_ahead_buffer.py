@@ -0,0 +1,87 @@
+import logging
+import threading
+
+import numpy as np
+
+class RenderAheadBuffer(threading.Thread):
+    """
+    Renders chunks from a source iterator ahead of time on its own thread, into a ring of preallocated chunks.
+
+    The buffer is itself an iterator, meant to be used as a StreamPlayer's input delegate: next() only copies
+    the oldest ready chunk out of the ring, so the audio callback never waits for the signal chain.
+    If no chunk is ready the callback gets silence and the underrun is counted.
+
+    There is one producer (this thread) and one consumer (the audio callback). Each side only ever writes its
+    own counter, so the ring needs no lock. More chunks of look-ahead absorb more GC and scheduling jitter,
+    at the cost of that many chunks of extra latency.
+    """
+    def __init__(self, source, frames_per_chunk, num_chunks=4):
+        super().__init__(name="RenderAheadBuffer")
+        self.log = logging.getLogger(__name__)
+        self.source = source
+        self.frames_per_chunk = frames_per_chunk
+        self.num_chunks = num_chunks
+        self._ring = np.zeros((self.num_chunks, self.frames_per_chunk), dtype=np.float32)
+        self._out = np.zeros(self.frames_per_chunk, dtype=np.float32)
+        self._space_available = threading.Event()
+        self._should_run = True
+        self.chunks_written = 0
+        self.chunks_read = 0
+        self.underruns = 0
+        self.min_fill_level = self.num_chunks
+
+    @property
+    def fill_level(self):
+        """The number of rendered chunks waiting to be played"""
+        return self.chunks_written - self.chunks_read
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        fill_level = self.chunks_written - self.chunks_read
+        if fill_level == 0:
+            self.underruns += 1
+            self.min_fill_level = 0
+            self._out.fill(0.0)
+            return self._out
+
+        if fill_level < self.min_fill_level:
+            self.min_fill_level = fill_level
+        np.copyto(self._out, self._ring[self.chunks_read % self.num_chunks])
+        self.chunks_read += 1
+        self._space_available.set()
+        return self._out
+
+    def run(self):
+        while self._should_run:
+            self._space_available.clear()
+            if self.chunks_written - self.chunks_read >= self.num_chunks:
+                self._space_available.wait(timeout=0.1)
+                continue
+
+            np.copyto(self._ring[self.chunks_written % self.num_chunks], next(self.source))
+            self.chunks_written += 1
+        return
+
+    def prefill(self):
+        """
+        Fill the ring on the calling thread, so playback starts with the full look-ahead
+        """
+        while self.chunks_written - self.chunks_read < self.num_chunks:
+            np.copyto(self._ring[self.chunks_written % self.num_chunks], next(self.source))
+            self.chunks_written += 1
+
+    def stop(self):
+        self._should_run = False
+        self._space_available.set()
+
+    def stats(self):
+        return {
+            "num_chunks": self.num_chunks,
+            "fill_level": self.fill_level,
+            "min_fill_level": self.min_fill_level,
+            "chunks_written": self.chunks_written,
+            "chunks_read": self.chunks_read,
+            "underruns": self.underruns,
+        }
@@ -39,8 +39,9 @@ class StreamPlayer():
     @property
     def input_delegate(self):
         """
-        This should be a callable object which returns the BYTES of an ndarray (aka calling tobytes() on it)
-        of size <frames_per_chunk>
+        This should be an iterator whose next() returns a float32 ndarray of size <frames_per_chunk>.
+        The array is handed to the audio device as it is, without a tobytes() copy, so it only has to stay
+        intact until the next call to next()
         """
         return self._input_delegate
     
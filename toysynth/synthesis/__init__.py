@@ -1 +1,5 @@
-from .synthesizer import Synthesizer
\ No newline at end of file
+from .sample_clock import SampleClock
+from .voice_allocator import VoiceAllocator
+from .render_pool import RenderPool
+from .synthesizer import Synthesizer
+from .offline_renderer import OfflineRenderer
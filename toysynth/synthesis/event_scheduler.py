@@ -0,0 +1,45 @@
+import logging
+import heapq
+import queue
+
+class EventScheduler():
+    """
+    Holds controller events until the frame they should take effect on.
+
+    Events are scheduled at a frame on the synth's sample clock, from any thread. The render thread
+    calls pop_due() once per chunk and renders the chunk in pieces, applying each event exactly on its frame.
+    Events that are already late are due straight away. Events on the same frame keep the order they were scheduled in.
+    """
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self._incoming = queue.SimpleQueue() # thread safe hand off to the render thread, which owns the heap
+        self._events = []
+        self._sequence = 0
+        self.late_events = 0
+
+    def schedule(self, frame, event):
+        self._incoming.put((int(frame), event))
+
+    def __len__(self):
+        return len(self._events) + self._incoming.qsize()
+
+    def pop_due(self, start_frame, end_frame):
+        """
+        Returns a list of (offset, event) tuples for the events due before end_frame, in order.
+        offset is the frame the event falls on relative to start_frame.
+        """
+        while True:
+            try:
+                (frame, event) = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            heapq.heappush(self._events, (frame, self._sequence, event))
+            self._sequence += 1
+
+        due = []
+        while self._events and self._events[0][0] < end_frame:
+            (frame, _, event) = heapq.heappop(self._events)
+            if frame < start_frame:
+                self.late_events += 1
+            due.append((max(frame - start_frame, 0), event))
+        return due
@@ -0,0 +1,80 @@
+import logging
+import time
+import wave
+
+import mido
+import numpy as np
+
+from toysynth.communication import Mailbox, Event, EventType
+from .synthesizer import Synthesizer
+
+class OfflineRenderer():
+    """
+    Renders a MIDI file straight to a WAV file, as fast as the CPU allows.
+    The synth is driven directly from the file's event timeline, so no audio device,
+    MQTT broker or virtual MIDI port is needed.
+    """
+    def __init__(self, sample_rate, frames_per_chunk, num_voices=8, engine=Synthesizer.Engine.VOICE_BANK, tail_length=2.0, render_workers=0, render_threads=0, output_sample_rate=0, output_frames_per_chunk=0):
+        self.log = logging.getLogger(__name__)
+        self.sample_rate = sample_rate
+        self.frames_per_chunk = frames_per_chunk
+        self.num_voices = num_voices
+        self.engine = engine
+        self.tail_length = tail_length # seconds to keep rendering after the last event so releases and delays can ring out
+        self.render_workers = render_workers # for the process pool engine. 0 uses one worker per core
+        self.render_threads = render_threads # for the chain engine
+        self.output_sample_rate = output_sample_rate or sample_rate # the WAV file's rate. The synth's output is resampled to it
+        self.output_frames_per_chunk = output_frames_per_chunk # the chunk size at the WAV file's rate. 0 derives it
+
+    def get_timeline(self, midi_file):
+        """
+        Returns a list of (frame, Event) tuples for every event in the file the synth understands
+        """
+        timeline = []
+        elapsed = 0.0
+        for msg in midi_file: # iterating a MidiFile merges the tracks and gives delta times in seconds
+            elapsed += msg.time
+            if msg.is_meta:
+                continue
+            if event := Event.from_mido(msg):
+                timeline.append((int(elapsed * self.sample_rate), event)) # frames on the synth's sample clock
+        return timeline
+
+    def render(self, midi_path, wav_path):
+        start_time = time.perf_counter()
+        midi_file = mido.MidiFile(midi_path)
+        synth = Synthesizer(Mailbox(), self.sample_rate, self.frames_per_chunk, num_voices=self.num_voices, engine=self.engine, render_workers=self.render_workers, render_threads=self.render_threads, output_sample_rate=self.output_sample_rate, output_frames_per_chunk=self.output_frames_per_chunk)
+
+        try:
+            # Pick mono or poly mode depending on the midi file type, like the MidiPlayer does
+            self.log.info(f"Opened MIDI file type {midi_file.type}")
+            cc_num = 127 if midi_file.type == 0 else 126
+            synth.handle_event(Event(EventType.CONTROL_CHANGE, 0, cc_num, 1))
+
+            # Every event is applied on its exact frame by the synth's scheduler
+            last_frame = 0
+            for (frame, event) in self.get_timeline(midi_file):
+                synth.scheduler.schedule(frame, event)
+                last_frame = frame
+
+            generator = synth.output_generator()
+            with wave.open(wav_path, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(self.output_sample_rate)
+
+                end_frame = last_frame + synth.clock.frames(self.tail_length)
+                while synth.clock.frame < end_frame:
+                    self.write_chunk(wav_file, next(generator))
+        finally:
+            synth.close()
+        frames_rendered = synth.clock.frame
+        elapsed = time.perf_counter() - start_time
+        duration = frames_rendered / self.sample_rate
+        self.log.info(f"Events: {synth.event_stats()}")
+        self.log.info(f"Rendered {duration:.1f}s of audio from {midi_path} to {wav_path} in {elapsed:.1f}s ({duration / elapsed:.1f}x real time)")
+        return frames_rendered
+
+    def write_chunk(self, wav_file, chunk):
+        pcm = np.clip(chunk, -1.0, 1.0) * 32767
+        wav_file.writeframes(pcm.astype("<i2").tobytes())
@@ -0,0 +1,225 @@
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from time import perf_counter
+
+import numpy as np
+
+class RenderPool():
+    """
+    Renders the chain engine's voices on a pool of worker processes, so polyphony scales with cores instead of
+    being limited to one core by the GIL.
+
+    Voice i is owned by worker i % num_workers, so voices handed out in index order are spread over the workers.
+    Every worker runs a Synthesizer of its own with just its voices and renders them into its row of a
+    (num_workers x frames_per_chunk) shared memory mix. render() tells every worker to render, waits for all of
+    them and sums their rows. Note on and note off go to the worker that owns the voice, parameter changes go to
+    every worker. Messages go through one pipe per worker, so a worker always sees the events before the render
+    they were applied in front of, and every voice renders exactly what it would render in a single process.
+    The workers also publish the envelope level and active state of each of their voices, and how long they
+    spent rendering, in shared memory.
+    A worker that fails to render replies with an error instead of exiting, and render() only waits render_timeout
+    seconds for the replies. A worker that errors, is late or has died is left out of that chunk's mix, so it
+    drops out as silence instead of stalling the audio. Replies carry the number of the render they belong to,
+    so a late reply is thrown away instead of being taken for the next one.
+    """
+    def __init__(self, sample_rate, frames_per_chunk, num_voices, num_workers, batch_filters=True, render_timeout=1.0):
+        self.log = logging.getLogger(__name__)
+        self.num_voices = num_voices
+        self.num_workers = max(1, min(num_workers, num_voices))
+        self.frames_per_chunk = frames_per_chunk
+        self.render_timeout = render_timeout
+        self.renders = 0
+
+        self._mix_shm = shared_memory.SharedMemory(create=True, size=self.num_workers * frames_per_chunk * np.dtype(np.float32).itemsize)
+        self._state_shm = shared_memory.SharedMemory(create=True, size=(2 * num_voices + self.num_workers) * np.dtype(np.float64).itemsize)
+        (self.mix, self.voice_amps, self.voice_active, self.render_times) = RenderPool.shared_arrays(self._mix_shm, self._state_shm, frames_per_chunk, num_voices, self.num_workers)
+        self.mix.fill(0.0)
+        self.voice_amps.fill(0.0)
+        self.voice_active.fill(0.0)
+        self.render_times.fill(0.0)
+
+        # spawn, since the synth runs next to other threads that a forked child would inherit in a random state
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.workers = []
+        for worker_index in range(self.num_workers):
+            (connection, worker_connection) = context.Pipe()
+            worker = context.Process(target=run_render_worker, name=f"RenderWorker{worker_index}", daemon=True,
+                                     args=(worker_connection, worker_index, self.num_workers, num_voices, sample_rate, frames_per_chunk,
+                                           batch_filters, self._mix_shm.name, self._state_shm.name))
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+        self.alive = [True] * self.num_workers
+        # Wait for every worker to build its synth, so the render timeout doesn't count their start up
+        for (worker_index, connection) in enumerate(self.connections):
+            try:
+                connection.recv()
+            except (EOFError, OSError) as e:
+                self.worker_died(worker_index, e)
+        self.log.info(f"Started {self.num_workers} render workers for {num_voices} voices")
+
+    @staticmethod
+    def shared_arrays(mix_shm, state_shm, frames_per_chunk, num_voices, num_workers):
+        """
+        Returns the (mix, voice_amps, voice_active, render_times) arrays laid out on the shared memory blocks
+        """
+        mix = np.ndarray((num_workers, frames_per_chunk), dtype=np.float32, buffer=mix_shm.buf)
+        state = np.ndarray(2 * num_voices + num_workers, dtype=np.float64, buffer=state_shm.buf)
+        return (mix, state[:num_voices], state[num_voices:2 * num_voices], state[2 * num_voices:])
+
+    def owner(self, index):
+        """Returns the (worker, index on the worker) of a voice"""
+        return (index % self.num_workers, index // self.num_workers)
+
+    def worker_died(self, worker_index, error):
+        if self.alive[worker_index]:
+            self.log.error(f"Render worker {worker_index} is gone, its voices will be silent: {error!r}")
+        self.alive[worker_index] = False
+
+    def send(self, worker_index, message):
+        if not self.alive[worker_index]:
+            return
+        try:
+            self.connections[worker_index].send(message)
+        except (BrokenPipeError, OSError) as e:
+            self.worker_died(worker_index, e)
+
+    def note_on(self, index, frequency, id):
+        (worker, local_index) = self.owner(index)
+        self.voice_active[index] = 1.0 # the worker overwrites this on its next render, after it has applied the note
+        self.send(worker, ("note_on", local_index, frequency, id))
+
+    def note_off(self, index):
+        (worker, local_index) = self.owner(index)
+        self.send(worker, ("note_off", local_index))
+
+    def call(self, method, *args):
+        """
+        Call a Synthesizer method, e.g. set_attack, on every worker
+        """
+        for worker_index in range(self.num_workers):
+            self.send(worker_index, ("call", method, args))
+
+    def render(self, out):
+        """
+        Render every voice into out.
+        Workers that don't reply in time, or reply with an error, are left out of the mix
+        """
+        num_frames = len(out)
+        self.renders += 1
+        for worker_index in range(self.num_workers):
+            self.send(worker_index, ("render", self.renders, num_frames))
+        deadline = perf_counter() + self.render_timeout
+        out.fill(0.0)
+        for worker_index in range(self.num_workers):
+            if self.receive(worker_index, deadline):
+                out += self.mix[worker_index, :num_frames]
+
+    def receive(self, worker_index, deadline):
+        """
+        Wait until the deadline for a worker's reply to the current render.
+        Returns True if it rendered, or False if the worker failed, is late or is gone
+        """
+        connection = self.connections[worker_index]
+        while self.alive[worker_index]:
+            try:
+                if not connection.poll(max(0.0, deadline - perf_counter())):
+                    self.log.warning(f"Render worker {worker_index} missed render {self.renders}, its voices are silent for a chunk")
+                    return False
+                reply = connection.recv()
+            except (EOFError, OSError) as e:
+                self.worker_died(worker_index, e)
+                return False
+            match reply:
+                case ("rendered", render) if render == self.renders:
+                    return True
+                case ("error", render, error) if render == self.renders:
+                    self.log.error(f"Render worker {worker_index} failed render {render}, its voices are silent for a chunk: {error}")
+                    return False
+                case _:
+                    pass # the reply to a render that already timed out
+        return False
+
+    def stats(self):
+        """
+        Returns the total render time of every worker and its mean per render() call, in ms
+        """
+        renders = max(self.renders, 1)
+        return {
+            "render_ms": [round(1000 * float(t), 1) for t in self.render_times],
+            "mean_render_ms": [round(1000 * float(t) / renders, 3) for t in self.render_times],
+        }
+
+    def close(self):
+        for worker_index in range(self.num_workers):
+            self.send(worker_index, ("close",))
+        for worker in self.workers:
+            worker.join(timeout=2.0)
+            if worker.is_alive():
+                worker.terminate()
+        self.connections = []
+        self.workers = []
+        del (self.mix, self.voice_amps, self.voice_active, self.render_times)
+        for shm in (self._mix_shm, self._state_shm):
+            shm.close()
+            shm.unlink()
+
+def run_render_worker(connection, worker_index, num_workers, num_voices, sample_rate, frames_per_chunk, batch_filters, mix_shm_name, state_shm_name):
+    """
+    The main loop of a render worker process
+    """
+    from toysynth.communication import Mailbox
+    from .synthesizer import Synthesizer
+
+    log = logging.getLogger(__name__)
+    mix_shm = shared_memory.SharedMemory(name=mix_shm_name)
+    state_shm = shared_memory.SharedMemory(name=state_shm_name)
+    (mix, voice_amps, voice_active, render_times) = RenderPool.shared_arrays(mix_shm, state_shm, frames_per_chunk, num_voices, num_workers)
+    owned = list(range(worker_index, num_voices, num_workers))
+    synth = Synthesizer(Mailbox(), sample_rate, frames_per_chunk, num_voices=len(owned), engine=Synthesizer.Engine.CHAIN, batch_filters=batch_filters)
+    connection.send(("ready",))
+
+    should_run = True
+    while should_run:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        try:
+            match message:
+                case ("render", render, num_frames):
+                    start = perf_counter()
+                    out = mix[worker_index, :num_frames]
+                    out.fill(0.0)
+                    synth.render_voices(out)
+                    for (voice, index) in zip(synth.voices, owned):
+                        voice_amps[index] = voice.amp
+                        voice_active[index] = voice.active
+                    render_times[worker_index] += perf_counter() - start
+                    connection.send(("rendered", render))
+                case ("note_on", local_index, frequency, id):
+                    synth.voices[local_index].note_on(frequency, id)
+                    synth.active_voices.add(local_index)
+                case ("note_off", local_index):
+                    synth.voices[local_index].note_off()
+                case ("call", method, args):
+                    getattr(synth, method)(*args)
+                case ("close",):
+                    should_run = False
+                case _:
+                    log.error(f"Render worker {worker_index} got an unknown message: {message}")
+        except Exception as e:
+            # Keep the worker running, the parent leaves its voices out of the mix for the chunk
+            log.exception(f"Render worker {worker_index} failed on {message!r}")
+            if message[0] == "render":
+                try:
+                    connection.send(("error", message[1], repr(e)))
+                except (BrokenPipeError, OSError):
+                    break
+
+    del (mix, voice_amps, voice_active, render_times)
+    mix_shm.close()
+    state_shm.close()
+    connection.close()
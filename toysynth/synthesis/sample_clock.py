@@ -0,0 +1,18 @@
+class SampleClock():
+    """
+    The engine's time base: the number of frames rendered since the synth started.
+
+    The render path never asks the wall clock what time it is. Everything that needs a time
+    (envelopes, oscillators, event scheduling) counts frames from this clock instead,
+    so a render only depends on the events it was given and offline renders match real time ones exactly.
+    """
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frame = 0
+
+    def frames(self, seconds):
+        """Convert a duration in seconds to a whole number of frames"""
+        return int(round(seconds * self.sample_rate))
+
+    def advance(self, num_frames):
+        self.frame += num_frames
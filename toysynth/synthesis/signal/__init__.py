@@ -1,3 +1,6 @@
+from .component import Component
+from .generator import Generator
+from .oscillator import Oscillator
 from .sin_wave_oscillator import SinWaveOscillator
 from .square_wave_oscillator import SquareWaveOscillator
 from .triangle_wave_oscillator import TriangleWaveOscillator
@@ -6,9 +9,15 @@ from .mixer import Mixer
 from .constant_value_generator import ConstantValueGenerator
 from .noise_generator import NoiseGenerator
 from .signal_type import SignalType
+from .execution_plan import ExecutionPlan
 from .chain import Chain
 from .low_pass_filter import LowPassFilter
+from .butterworth_table import ButterworthTable
+from .biquad import Biquad
+from .filter_bank import FilterBank
 from .adsr_envelope import AdsrEnvelope
 from .delay import Delay
+from .delay_line import DelayLine
 from .gain import Gain
 from . import utils
+from .instrumentation import ComponentProfiler
@@ -1,7 +1,6 @@
 import logging
 from copy import deepcopy
 from enum import Enum
-import time
 
 import numpy as np
 
@@ -9,6 +8,14 @@ from .component import Component
 from .signal_type import SignalType
 
 class AdsrEnvelope(Component):
+    """
+    A linear ADSR envelope.
+    Every chunk is computed in closed form from the current stage and the number of frames since the stage
+    was triggered, so stages can change in the middle of a chunk and changing a parameter costs nothing.
+    The envelope ramps up to the amplitude of its source during the attack stage.
+    """
+    in_place = True
+
     class State(Enum):
         IDLE = 0
         ADS = 1
@@ -18,101 +25,122 @@ class AdsrEnvelope(Component):
         super().__init__(sample_rate, frames_per_chunk, signal_type=SignalType.WAVE, subcomponents=[], name="ADSR")
         self.log = logging.getLogger(__name__)
         self.add_subcomponent(source)
-        self._current_amp = 0.0
-        self._attack = np.float32(0.0)
-        self._decay = np.float32(0.0)
-        self._sustain = np.float32(1.0)
-        self._release = np.float32(0.0)
-        self._iteration_number = 0
-        self._sustain_frames_num = self.frames_per_chunk * 2
+        self._current_amp = np.float32(0.0)
+        self._release_amp = np.float32(0.0)
         self._target_amp = 1.0
-        self.calculate_ads_ramps()
-        self.calculate_r_ramp()
+        self._stage_frames = 0 # frames elapsed since the current stage was triggered
+        self.attack = 0.0
+        self.decay = 0.0
+        self.sustain = 1.0
+        self.release = 0.0
         self.state = AdsrEnvelope.State.IDLE
 
         # np.set_printoptions(threshold=self.sample_rate * 10)
 
     def __iter__(self):
         self.source_iter = iter(self.subcomponents[0])
-        self._stage_trig_time = time.time()
+        self._frame_offsets = np.arange(self.frames_per_chunk, dtype=np.float32)
+        self._envelope = np.zeros(self.frames_per_chunk, dtype=np.float32)
         self._props["amp"] = self._current_amp
         return self
-    
-    def __next__(self):
-        (source_chunk, props) = next(self.source_iter)
-        if self._target_amp != props["amp"]:
-            self._target_amp = props["amp"]
-            self.calculate_ads_ramps()
-        match self.state:
-            case AdsrEnvelope.State.ADS:
-                ramp_index = self._iteration_number * self.frames_per_chunk
-                if ramp_index + self.frames_per_chunk > len(self._ads_ramp):
-                    ramp_index = len(self._ads_ramp) - self.frames_per_chunk
-                self._iteration_number += 1
-                end_index = ramp_index + self.frames_per_chunk # ramp index is guaranteed to be within range
-                ramp_chunk = self._ads_ramp[ramp_index:end_index]
-                source_chunk = source_chunk * ramp_chunk
-                # self.log.debug(f"Ramp chunk:\n{ramp_chunk}")
-                self._current_amp = ramp_chunk[-1]
-
-                now = time.time()
-                elapsed = now - self._stage_trig_time
-                if not self.active:
-                    self.state = AdsrEnvelope.State.RELEASE
-                    self._stage_trig_time = time.time()
-                    self._iteration_number = 0
-                    self.calculate_r_ramp()
-                    # self.log.debug(f"{self.name}: Triggered release state after {elapsed}s")
-
-                self._props["amp"] = self._current_amp
-                return (source_chunk, self._props)
-
-            case AdsrEnvelope.State.RELEASE:
-                now = time.time()
-                elapsed = now - self._stage_trig_time
-                ramp_index = self._iteration_number * self.frames_per_chunk
-                self._iteration_number += 1
-                if self.active:
-                    self.trigger_attack()
-
-                if ramp_index + self.frames_per_chunk > len(self._r_ramp):
-                    partial_chunk = self._r_ramp[ramp_index:]
-                    zeros = np.zeros((self.frames_per_chunk - len(partial_chunk)), dtype=np.float32)
-                    ramp_chunk = np.concatenate([partial_chunk, zeros], axis=0)
-                    # self.log.debug(f"{self.name}: End of Release Ramp after {elapsed}s")
-                    if not self.active:
+
+    def process(self, out):
+        self.prepare()
+        props = self.source_iter.process(out)
+        return self.render_from(out, ((out, props),))
+
+    def prepare(self):
+        # Follow the gate before rendering the source, so a new note sounds from the first frame of this chunk
+        self.update_state()
+
+    def render_from(self, out, sources):
+        (_, props) = sources[0]
+        self._target_amp = props["amp"]
+        silent = props.get("silent", False)
+        if self.state == AdsrEnvelope.State.IDLE:
+            # The envelope is all zeros until the next attack
+            if not silent:
+                out.fill(0.0)
+            self._current_amp = np.float32(0.0)
+            self._props["amp"] = self._current_amp
+            self._props["silent"] = True
+            return self._props
+        envelope = self._envelope[:len(out)]
+        self.render_envelope(envelope, 0, len(out))
+        if not silent:
+            out *= envelope
+        self._props["amp"] = self._current_amp
+        self._props["silent"] = silent
+        return self._props
+
+    def update_state(self):
+        """
+        Start the attack or release stage if the gate changed since the last chunk
+        """
+        if self.active and self.state != AdsrEnvelope.State.ADS:
+            self.trigger_attack()
+        elif not self.active and self.state == AdsrEnvelope.State.ADS:
+            self.trigger_release()
+
+    def render_envelope(self, envelope, start, end):
+        """
+        Write the envelope for frames start to end of the chunk into envelope, advancing through the stages as needed
+        """
+        frame = start
+        while frame < end:
+            match self.state:
+                case AdsrEnvelope.State.ADS:
+                    if self._stage_frames < self._attack_frames:
+                        num_frames = min(end - frame, self._attack_frames - self._stage_frames)
+                        slope = self._target_amp / self._attack_frames
+                        self.write_ramp(envelope, frame, num_frames, self._stage_frames * slope, slope)
+                    elif self._stage_frames < self._attack_frames + self._decay_frames:
+                        num_frames = min(end - frame, self._attack_frames + self._decay_frames - self._stage_frames)
+                        slope = (self._sustain - self._target_amp) / self._decay_frames
+                        decay_frames = self._stage_frames - self._attack_frames
+                        self.write_ramp(envelope, frame, num_frames, self._target_amp + decay_frames * slope, slope)
+                    else:
+                        num_frames = end - frame
+                        envelope[frame:end] = self._sustain
+                    self._stage_frames += num_frames
+
+                case AdsrEnvelope.State.RELEASE:
+                    if self._stage_frames >= self._release_frames:
                         self.state = AdsrEnvelope.State.IDLE
-                else:
-                    end_index = ramp_index + self.frames_per_chunk
-                    ramp_chunk = self._r_ramp[ramp_index:end_index]
-                self._current_amp = ramp_chunk[-1]
-
-                source_chunk = source_chunk * ramp_chunk
-                self._props["amp"] = self._current_amp
-                return (source_chunk, self._props)
-            case AdsrEnvelope.State.IDLE:
-                if self.subcomponents[0].active:
-                    self.subcomponents[0].active = False
-                if self.active:
-                    self.trigger_attack()
-                self._props["amp"] = 0.0
-                return (np.zeros(self.frames_per_chunk, dtype=np.float32), self._props)
-
-
-        
+                        self.subcomponents[0].active = False
+                        # self.log.debug(f"{self.name}: End of Release Ramp")
+                        continue
+                    num_frames = min(end - frame, self._release_frames - self._stage_frames)
+                    slope = -self._release_amp / self._release_frames
+                    self.write_ramp(envelope, frame, num_frames, self._release_amp + self._stage_frames * slope, slope)
+                    self._stage_frames += num_frames
+
+                case AdsrEnvelope.State.IDLE:
+                    num_frames = end - frame
+                    envelope[frame:end] = 0.0
+
+            frame += num_frames
+
+        self._current_amp = envelope[end - 1]
+
+    def write_ramp(self, envelope, start, num_frames, start_value, slope):
+        ramp = envelope[start:start + num_frames]
+        np.multiply(self._frame_offsets[:num_frames], np.float32(slope), out=ramp)
+        ramp += np.float32(start_value)
+
     def __deepcopy__(self, memo):
         return AdsrEnvelope(self.sample_rate, self.frames_per_chunk, deepcopy(self.subcomponents[0], memo))
-    
+
     @property
     def attack(self):
         return self._attack
-    
+
     @attack.setter
     def attack(self, value):
         try:
             float_val = np.float32(value)
             self._attack = float_val
-            self.calculate_ads_ramps()
+            self._attack_frames = int(self.sample_rate * float_val)
         except ValueError:
             self.log.error(f"Couldn't set with value {value}")
 
@@ -125,32 +153,32 @@ class AdsrEnvelope(Component):
         try:
             float_val = np.float32(value)
             self._decay = float_val
-            self.calculate_ads_ramps()
+            self._decay_frames = int(self.sample_rate * float_val)
         except ValueError:
             self.log.error(f"Couldn't set with value {value}")
 
     @property
     def sustain(self):
         return self._sustain
-    
+
     @sustain.setter
     def sustain(self, value):
         try:
             float_val = np.float32(value)
             self._sustain = float_val
-            self.calculate_ads_ramps()
         except ValueError:
             self.log.error(f"Couldn't set with value {value}")
 
     @property
     def release(self):
         return self._release
-    
+
     @release.setter
     def release(self, value):
         try:
             float_val = np.float32(value)
             self._release = float_val
+            self._release_frames = int(self.sample_rate * float_val)
         except ValueError:
             self.log.error(f"Couldn't set with value {value}")
 
@@ -161,7 +189,7 @@ class AdsrEnvelope(Component):
         If the component is a generator it should generate zeros when inactive.
         """
         return self._active
-    
+
     @active.setter
     def active(self, value):
         """
@@ -173,37 +201,24 @@ class AdsrEnvelope(Component):
         except ValueError:
             self.log.error(f"Unable to set with value {value}")
 
-    def calculate_ads_ramps(self):
-        attack_frames = int(self.sample_rate * self.attack) # attack is in s
-        attack_ramp = np.linspace(0, self._target_amp, attack_frames, dtype=np.float32, endpoint=False)
-
-        decay_frames = int(self.sample_rate * self.decay)
-        self._decay_index = attack_frames
-        decay_ramp = np.linspace(self._target_amp, self.sustain, decay_frames, dtype=np.float32, endpoint=False)
-
-        # we need to have at least one full chunk in the sustain ramp. 
-        # Usually we'll partially cross into the sustain region from the decay in one chunk, 
-        # then the next chunks can read from the sustain region over and over until the note is released
-        sustain_frames = self._sustain_frames_num
-        self._sustain_index = self._decay_index + decay_frames
-        sustain_ramp = np.full(sustain_frames, self.sustain, dtype=np.float32)
-
-        self._ads_ramp = np.concatenate([attack_ramp, decay_ramp, sustain_ramp], axis=0)
-        # self.log.debug(f"ADS Ramp:\n{self._ads_ramp}")
-
-    def calculate_r_ramp(self):
-        release_frames = int(self.sample_rate * self.release)
-        self._release_index = self._sustain_index + (self._sustain_frames_num)
-        self._r_ramp = np.linspace(self._current_amp, 0, release_frames, endpoint=True)
-
-
     def trigger_attack(self):
+        """
+        Start the attack stage from the current level, so retriggering a releasing note doesn't click
+        """
         self.state = AdsrEnvelope.State.ADS
-        self._stage_trig_time = time.time()
-        self._iteration_number = 0
+        if self._target_amp > 0:
+            self._stage_frames = int(min(self._current_amp / self._target_amp, 1.0) * self._attack_frames)
+        else:
+            self._stage_frames = 0
         for sub in self.subcomponents:
             sub.active = True
         # self.log.info(f"{self.name}: Triggered attack stage")
 
+    def trigger_release(self):
+        self.state = AdsrEnvelope.State.RELEASE
+        self._stage_frames = 0
+        self._release_amp = self._current_amp
+        # self.log.debug(f"{self.name}: Triggered release state")
+
     def is_silent(self):
         return self.state == self.State.IDLE and not self.active
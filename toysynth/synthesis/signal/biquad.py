@@ -0,0 +1,69 @@
+import logging
+
+import numpy as np
+from scipy.signal import lfilter, sosfilt
+
+try:
+    # The Cython kernel behind sosfilt. It filters its samples and state in place, where sosfilt copies both
+    from scipy.signal._sosfilt import _sosfilt
+except ImportError:
+    _sosfilt = None
+
+class Biquad():
+    """
+    Filters float32 blocks in place with 2nd order (b, a) coefficients, without allocating sample buffers.
+
+    The rows of a block are copied into a float64 scratch buffer, run through one second order section in place,
+    and copied back. That's the same arithmetic lfilter does for float32 samples with float64 coefficients
+    (transposed direct form II, in double precision), so the output is bit-identical to lfilter's and the state of
+    a row is laid out like lfilter's zi. Coefficients of any other order fall back to lfilter, which allocates.
+    """
+    def __init__(self, num_rows, frames_per_chunk):
+        self.log = logging.getLogger(__name__)
+        self._samples = np.zeros(num_rows * frames_per_chunk, dtype=np.float64)
+        self._state = np.zeros(num_rows * 2, dtype=np.float64)
+        self._sos = np.zeros((1, 6), dtype=np.float64)
+
+    def process(self, b, a, block, zi, rows=None):
+        """
+        Filter a float32 (rows x frames) block in place. zi holds the lfilter state of every row and is updated in place.
+        Pass rows to say which rows of zi the block's rows belong to. By default block row i is zi row i,
+        and zi must be contiguous.
+        """
+        if len(b) != 3 or len(a) != 3 or a[0] != 1.0:
+            self.process_lfilter(b, a, block, zi, rows)
+            return block
+
+        (num_rows, num_frames) = block.shape
+        samples = self._samples[:num_rows * num_frames].reshape(num_rows, num_frames)
+        np.copyto(samples, block)
+        self._sos[0, :3] = b
+        self._sos[0, 3:] = a
+        if rows is None:
+            Biquad.filter(self._sos, samples, zi.reshape(num_rows, 1, 2))
+        else:
+            state = self._state[:2 * num_rows].reshape(num_rows, 1, 2)
+            for (i, row) in enumerate(rows):
+                state[i, 0] = zi[row]
+            Biquad.filter(self._sos, samples, state)
+            for (i, row) in enumerate(rows):
+                zi[row] = state[i, 0]
+        np.copyto(block, samples, casting="same_kind")
+        return block
+
+    @staticmethod
+    def filter(sos, samples, state):
+        if _sosfilt is not None:
+            _sosfilt(sos, samples, state)
+        else:
+            (samples[...], state[...]) = sosfilt(sos, samples, axis=-1, zi=state)
+
+    def process_lfilter(self, b, a, block, zi, rows):
+        if rows is None:
+            (filtered, zf) = lfilter(b, a, block, axis=-1, zi=zi.reshape(block.shape[0], -1))
+            zi[...] = zf.reshape(zi.shape)
+            np.copyto(block, filtered, casting="same_kind")
+            return
+        for (i, row) in enumerate(rows):
+            (filtered, zi[row]) = lfilter(b, a, block[i], zi=zi[row])
+            np.copyto(block[i], filtered, casting="same_kind")
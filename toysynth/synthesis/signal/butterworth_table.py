@@ -0,0 +1,119 @@
+import logging
+import math
+import os
+import tempfile
+
+import numpy as np
+from scipy.signal import butter
+
+class ButterworthTable():
+    """
+    Low pass Butterworth coefficients for one filter order and sample rate, designed once for a log spaced
+    grid of cutoff frequencies and shared by every filter that uses them.
+
+    The grid spans the synth's cutoff CC range (16 Hz to 16384 Hz, 128 steps) with STEPS_PER_CC entries per
+    CC step, so every CC value is an exact entry. Cutoffs in between are linearly interpolated between the two
+    nearest entries, which keeps a 2nd order section stable because its stable (a1, a2) region is convex.
+    If cache_dir is set, the grid is saved there the first time it's designed and loaded from there afterwards.
+    It's None by default, so building a filter doesn't write to disk unless the app opts in.
+    Saves go through a temporary file that replaces the cache in one step, so processes that design the same table at
+    the same time can't leave a torn file behind, and a cache that can't be read is designed again.
+    """
+    MIN_OCTAVE = 4 # 2^4 = 16 Hz
+    MAX_OCTAVE = 14 # 2^14 = 16384 Hz
+    CC_STEPS = 127
+    STEPS_PER_CC = 8
+    cache_dir = None # where tables are cached between runs. None doesn't cache them
+    _tables = {}
+
+    @staticmethod
+    def get(order, sample_rate):
+        """
+        Returns the shared table for a filter order and sample rate, creating it if needed
+        """
+        key = (int(order), int(sample_rate))
+        if (table := ButterworthTable._tables.get(key)) is None:
+            table = ButterworthTable(*key)
+            ButterworthTable._tables[key] = table
+        return table
+
+    def __init__(self, order, sample_rate):
+        self.log = logging.getLogger(__name__)
+        self.order = int(order)
+        self.sample_rate = int(sample_rate)
+        self.num_entries = ButterworthTable.CC_STEPS * ButterworthTable.STEPS_PER_CC + 1
+        self.steps_per_octave = (self.num_entries - 1) / (ButterworthTable.MAX_OCTAVE - ButterworthTable.MIN_OCTAVE)
+        self.max_cutoff = 0.99 * 0.5 * self.sample_rate # butter needs the cutoff to be below nyquist
+        self.cutoffs = np.minimum(np.logspace(ButterworthTable.MIN_OCTAVE, ButterworthTable.MAX_OCTAVE, self.num_entries, base=2), self.max_cutoff)
+        if not self.load():
+            self.design()
+            self.save()
+
+    @property
+    def cache_path(self):
+        return os.path.join(ButterworthTable.cache_dir, f"butterworth_o{self.order}_sr{self.sample_rate}_n{self.num_entries}.npz")
+
+    def design(self):
+        nyquist = 0.5 * self.sample_rate
+        self.b = np.zeros((self.num_entries, self.order + 1))
+        self.a = np.zeros((self.num_entries, self.order + 1))
+        for (i, cutoff) in enumerate(self.cutoffs):
+            self.b[i], self.a[i] = butter(self.order, cutoff / nyquist, btype='low', analog=False)
+        self.log.info(f"Designed {self.num_entries} low pass filters of order {self.order} at {self.sample_rate} Hz")
+
+    def load(self):
+        if ButterworthTable.cache_dir is None:
+            return False
+        try:
+            with np.load(self.cache_path) as cached:
+                (b, a) = (cached["b"], cached["a"])
+            if b.shape != (self.num_entries, self.order + 1) or a.shape != b.shape:
+                raise ValueError("Cached table has the wrong shape")
+            (self.b, self.a) = (b, a)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            # e.g. a torn or truncated file (BadZipFile, EOFError). Treat it like a cache miss
+            self.log.warning(f"Couldn't load filter coefficients from {self.cache_path}: {e!r}")
+            return False
+
+    def save(self):
+        if ButterworthTable.cache_dir is None:
+            return
+        temp_path = None
+        try:
+            os.makedirs(ButterworthTable.cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=ButterworthTable.cache_dir, suffix=".npz.tmp", delete=False) as temp_file:
+                temp_path = temp_file.name
+                np.savez(temp_file, b=self.b, a=self.a)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            self.log.warning(f"Couldn't save filter coefficients to {self.cache_path}: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def coefficients(self, cutoff):
+        """
+        Returns the (b, a) coefficients for a cutoff frequency in Hz
+        """
+        position = (math.log2(max(cutoff, 1.0)) - ButterworthTable.MIN_OCTAVE) * self.steps_per_octave
+        position = min(max(position, 0.0), self.num_entries - 1.0)
+        index = int(position)
+        fraction = position - index
+        if fraction == 0.0:
+            return (self.b[index], self.a[index])
+        b = self.b[index] + fraction * (self.b[index + 1] - self.b[index])
+        a = self.a[index] + fraction * (self.a[index + 1] - self.a[index])
+        return (b, a)
+
+    @staticmethod
+    def smooth_cutoff(current, target, num_frames, smoothing_frames):
+        """
+        Move a cutoff frequency towards its target, exponentially in octaves, by num_frames worth of a one pole
+        smoother with a time constant of smoothing_frames. Returns the target once it's within 0.1%.
+        """
+        if smoothing_frames <= 0 or current <= 0 or abs(target / current - 1.0) < 1e-3:
+            return target
+        alpha = 1.0 - math.exp(-num_frames / smoothing_frames)
+        return current * (target / current) ** alpha
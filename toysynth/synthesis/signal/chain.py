@@ -9,38 +9,129 @@ from .low_pass_filter import LowPassFilter
 from .adsr_envelope import AdsrEnvelope
 from .signal_type import SignalType
 from .delay import Delay
-from .gain import Gain
+from .execution_plan import ExecutionPlan
 
 class Chain(Component):
+    """
+    The root of a signal chain, with setters that fan a parameter out to every component it applies to.
+
+    The chain keeps an index from component class and control tag to the components in the tree,
+    so setting a parameter only touches its targets instead of walking the tree.
+    The index is built when the chain is created and rebuilt the next time it's used after any component tree changes.
+
+    By default the chain renders through an ExecutionPlan compiled from the tree when it's iterated,
+    and recompiled like the index. Set compiled to False to render through the tree of iterators instead.
+    """
+    # parameter name -> (component class, attribute) of every addressable parameter
+    PARAMETERS = {
+        "attack": (AdsrEnvelope, "attack"),
+        "decay": (AdsrEnvelope, "decay"),
+        "sustain": (AdsrEnvelope, "sustain"),
+        "release": (AdsrEnvelope, "release"),
+        "cutoff": (LowPassFilter, "cutoff_frequency"),
+        "delay_time": (Delay, "delay_time"),
+        "delay_wet_gain": (Delay, "wet_gain"),
+        "delay_feedback": (Delay, "feedback"),
+    }
+
     def __init__(self, sample_rate, frames_per_chunk, root_component: Component):
         super().__init__(sample_rate, frames_per_chunk, signal_type=SignalType.WAVE, subcomponents=[root_component], name="Chain")
         self.log = logging.getLogger(__name__)
         self.sample_rate = sample_rate
         self.frames_per_chunk = frames_per_chunk
+        self.build_index()
+        self.plan = None
+        self.compiled = True
 
     def __iter__(self):
         self.root_iter = iter(self.subcomponents[0])
+        self.compile()
         return self
+
+    @property
+    def compiled(self):
+        """True if the chain renders through an ExecutionPlan"""
+        return self._compiled
+
+    @compiled.setter
+    def compiled(self, value):
+        self._compiled = bool(value)
+        if hasattr(self, "root_iter"):
+            self.compile()
+
+    def compile(self):
+        """
+        Compile the tree into an ExecutionPlan, if the chain is compiled
+        """
+        self.plan = ExecutionPlan(self.subcomponents[0], self.frames_per_chunk) if self.compiled else None
+        self._plan_generation = self.tree_generation
     
     def __next__(self):
         (chunk, props) = next(self.root_iter)
         return (chunk, props)
+
+    def process(self, out):
+        if self.plan is None:
+            return self.root_iter.process(out)
+        if self._plan_generation != self.tree_generation:
+            self.compile()
+        return self.plan.process(out)
     
     def __deepcopy__(self, memo):
         return Chain(self.sample_rate, self.frames_per_chunk, deepcopy(self.subcomponents[0], memo))
-    
-    def get_components_by_class(self, cls):
-        components = []
 
-        def search_subcomponents(component):
-            if isinstance(component, cls):
-                components.append(component)
-            if hasattr(component, "subcomponents") and len(component.subcomponents) > 0:
-                for subcomponent in component.subcomponents:
-                    search_subcomponents(subcomponent)
+    def build_index(self):
+        """
+        Index every component in the tree under each of its classes and under its control tag
+        """
+        self._class_index = {}
+        self._tag_index = {}
+
+        def index_subcomponents(component):
+            for cls in type(component).__mro__:
+                self._class_index.setdefault(cls, []).append(component)
+            if (control_tag := getattr(component, "control_tag", None)) is not None:
+                self._tag_index.setdefault(control_tag, []).append(component)
+            for subcomponent in getattr(component, "subcomponents", []):
+                index_subcomponents(subcomponent)
+
+        index_subcomponents(self.subcomponents[0])
+        self._index_generation = self.tree_generation
+
+    def invalidate_index(self):
+        """
+        Rebuild the index the next time it's used. Only needed if a tree was changed without going through Component
+        """
+        self._index_generation = None
 
-        search_subcomponents(self.subcomponents[0])
-        return components
+    def get_components_by_class(self, cls):
+        if self._index_generation != self.tree_generation:
+            self.build_index()
+        return self._class_index.get(cls, [])
+
+    def get_components_by_control_tag(self, ctrl_tag):
+        if self._index_generation != self.tree_generation:
+            self.build_index()
+        return self._tag_index.get(ctrl_tag, [])
+
+    @property
+    def parameters(self):
+        """
+        The names of the parameters that have at least one target in this chain, including gain control tags
+        """
+        names = [name for (name, (cls, _)) in Chain.PARAMETERS.items() if self.get_components_by_class(cls)]
+        return names + list(self._tag_index)
+
+    def set_parameter(self, name, value):
+        """
+        Set a parameter by name on every component it applies to. Gains are addressed by their control tag
+        """
+        if name in Chain.PARAMETERS:
+            (cls, attribute) = Chain.PARAMETERS[name]
+            for component in self.get_components_by_class(cls):
+                setattr(component, attribute, value)
+        else:
+            self.set_gain_by_control_tag(name, value)
     
     def note_on(self, frequency):
         self.active = True
@@ -54,37 +145,32 @@ class Chain(Component):
         self.subcomponents[0].active = False
 
     def set_filter_cutoff(self, cutoff):
-        for lpf in self.get_components_by_class(LowPassFilter):
-            lpf.cutoff_frequency = np.float32(cutoff)
+        self.set_parameter("cutoff", np.float32(cutoff))
 
     def set_attack(self, attack):
-        for env in self.get_components_by_class(AdsrEnvelope):
-            env.attack = attack
+        self.set_parameter("attack", attack)
 
     def set_decay(self, decay):
-        for env in self.get_components_by_class(AdsrEnvelope):
-            env.decay = decay
+        self.set_parameter("decay", decay)
 
     def set_sustain(self, sustain):
-        for env in self.get_components_by_class(AdsrEnvelope):
-            env.sustain = sustain
+        self.set_parameter("sustain", sustain)
 
     def set_release(self, release):
-        for env in self.get_components_by_class(AdsrEnvelope):
-            env.release = release
+        self.set_parameter("release", release)
 
     def set_delay_time(self, delay_time):
-        for delay in self.get_components_by_class(Delay):
-            delay.delay_time = delay_time
+        self.set_parameter("delay_time", delay_time)
 
     def set_delay_wet_gain(self, wet_gain):
-        for delay in self.get_components_by_class(Delay):
-            delay.wet_gain = wet_gain
+        self.set_parameter("delay_wet_gain", wet_gain)
+
+    def set_delay_feedback(self, feedback):
+        self.set_parameter("delay_feedback", feedback)
 
     def set_gain_by_control_tag(self, ctrl_tag, gain):
-        for component in self.get_components_by_class(Gain):
-            if component.control_tag == ctrl_tag:
-                component.amp = gain
+        for component in self.get_components_by_control_tag(ctrl_tag):
+            component.amp = gain
 
     def is_silent(self):
         return self.subcomponents[0].is_silent()
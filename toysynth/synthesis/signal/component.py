@@ -2,6 +2,7 @@ import logging
 from typing import List
 from copy import deepcopy
 import random
+import weakref
 
 import numpy as np
 
@@ -14,18 +15,39 @@ class Component():
     where props is a dictionary of properties related to the array.
     Every component props dict must have 
     - amp
+    and can have
+    - silent: True if the chunk is all zeros, so the components it feeds can skip their work.
+      Stateful components (e.g. Delay, LowPassFilter) keep rendering a silent input until their tail
+      has decayed below SILENCE_THRESHOLD.
     A component can have subcomponents, which should also be iterators.
 
+    Components also support an in place protocol: process(out) renders the next chunk into out,
+    a float32 array of size <frames_per_chunk>, and returns the props. Once the chain is running, rendering it
+    through process() doesn't allocate any buffers for samples. What's left are a few KB of small objects a chunk
+    (array views, NumPy scalars, props), however long the chunk is.
+    out can also be shorter than a chunk, so a chunk can be rendered in pieces that are split at
+    the frames where events are scheduled. Components that only implement __next__ must be
+    rendered in whole chunks.
+
+    Components with subcomponents can also implement render_from(out, sources), which renders the component
+    from the chunks its subcomponents already rendered, and optionally prepare(), which runs before the
+    subcomponents render. A Chain uses them to run the tree as a flat ExecutionPlan.
+
     A component must implement
     __iter__
-    __next__
+    __next__ or process
     __deepcopy__
     """
 
+    in_place = False # True if render_from renders on top of its only subcomponent's chunk, which is passed in as out
+    SILENCE_THRESHOLD = 1e-4 # -80 dBFS. Tails below this are cut off
+
     def __init__(self, sample_rate, frames_per_chunk, signal_type: SignalType, subcomponents: List['Component']=[], name="Component"):
         self.log = logging.getLogger(__name__)
         self.sample_rate = sample_rate
         self.frames_per_chunk = frames_per_chunk
+        self.tree_generation = 0 # bumped whenever this component's tree changes, so a Chain knows when to rebuild its index
+        self._parents = weakref.WeakSet() # the components this one is a subcomponent of
         self.subcomponents = subcomponents
         self.signal_type = signal_type
         self.active = False
@@ -36,9 +58,36 @@ class Component():
         return self
     
     def __next__(self):
-        self.log.error("Child class should override the __next__ method")
-        raise NotImplementedError
+        if type(self).process is Component.process:
+            self.log.error("Child class should override the __next__ or process method")
+            raise NotImplementedError
+        out = np.empty(self.frames_per_chunk, dtype=np.float32)
+        props = self.process(out)
+        return (out, props)
+
+    def process(self, out):
+        """
+        Render the next chunk into out and return the props.
+        This default is for components that only implement __next__, and copies their chunk into out.
+        """
+        (chunk, props) = next(self)
+        np.copyto(out, chunk)
+        return props
     
+    def prepare(self):
+        """
+        Called before the subcomponents render, when the component is rendered through render_from
+        """
+        pass
+
+    def render_from(self, out, sources):
+        """
+        Render the next chunk into out from sources, a tuple of the (chunk, props) every subcomponent rendered
+        for this chunk, in order, and return the props.
+        For in_place components, out already holds the only subcomponent's chunk.
+        """
+        raise NotImplementedError
+
     def __deepcopy__(self, memo):
         self.log.error("invoked deepcopy on base class")
         raise NotImplementedError
@@ -89,10 +138,40 @@ class Component():
         except ValueError:
             self.log.error(f"Unable to set with value {value}")
 
+    @property
+    def subcomponents(self):
+        """
+        The list of subcomponents. Change it through this setter or add_subcomponent(),
+        so chains containing this component notice the change.
+        """
+        return self._subcomponents
+
+    @subcomponents.setter
+    def subcomponents(self, value):
+        for subcomponent in getattr(self, "_subcomponents", []):
+            if isinstance(subcomponent, Component):
+                subcomponent._parents.discard(self)
+        self._subcomponents = value
+        for subcomponent in value:
+            if isinstance(subcomponent, Component):
+                subcomponent._parents.add(self)
+        self.tree_changed()
+
     def add_subcomponent(self, subcomponent):
         if not isinstance(subcomponent, Component):
             raise TypeError("Subcomponent must be an instance of Component class")
         self.subcomponents.append(subcomponent)
+        subcomponent._parents.add(self)
+        self.tree_changed()
+
+    def tree_changed(self):
+        """
+        Bump the tree generation of this component and of every component above it, up to the roots,
+        so only the chains containing the change rebuild their index and plan
+        """
+        self.tree_generation += 1
+        for parent in list(self._parents):
+            parent.tree_changed()
 
     def normalize_signal(self, signal):
         min_val = np.min(signal)
@@ -103,6 +182,19 @@ class Component():
 
         normalized_signal = 2 * (signal - min_val) / (max_val - min_val) - 1
         return normalized_signal
+
+    def normalize_signal_in_place(self, signal):
+        min_val = np.min(signal)
+        max_val = np.max(signal)
+
+        if min_val == max_val:
+            signal.fill(0.0)
+            return signal
+
+        signal -= min_val
+        signal *= 2 / (max_val - min_val)
+        signal -= 1
+        return signal
     
     def is_silent(self):
         return not self.active
@@ -32,9 +32,10 @@ class ConstantValueGenerator(Generator):
     def __iter__(self):
         return super().__iter__()
     
-    def __next__(self):
-        arr = np.full(self.frames_per_chunk, self.value, dtype=np.float32)
-        return (arr, self._props)
+    def process(self, out):
+        out.fill(self.value)
+        self._props["silent"] = self.value == 0.0
+        return self._props
 
     def __deepcopy__(self, memo):
         return ConstantValueGenerator(self.sample_rate, self.frames_per_chunk, self.value)
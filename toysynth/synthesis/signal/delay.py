@@ -1,61 +1,106 @@
 import logging
+import math
 from copy import deepcopy
 
 import numpy as np
 
 from .component import Component
+from .delay_line import DelayLine
 from .signal_type import SignalType
 
 class Delay(Component):
+    """
+    A feedback delay. The delayed signal is read from a DelayLine at delay_time (which can be a fraction of a frame)
+    and mixed in at wet_gain. By default the output is fed back into the line, so the echo decays by wet_gain
+    on every repeat. Set feedback to feed back the dry signal plus the delayed signal at a different gain instead.
+    The shortest delay is one chunk.
+    Once the input has been silent for tail_frames, the echoes have decayed below SILENCE_THRESHOLD,
+    so the line is cleared and the delay does no work until the input sounds again.
+    """
+    in_place = True
+
     def __init__(self, sample_rate, frames_per_chunk, subcomponents, name="Delay", delay_buffer_length=4.0) -> None:
         super().__init__(sample_rate, frames_per_chunk, signal_type=SignalType.WAVE, subcomponents=subcomponents, name=name)
         self.log = logging.getLogger(__name__)
         self.delay_buffer_length = delay_buffer_length
-        self._delay_time = 0.1
         self.delay_frames = int(self.delay_buffer_length * self.sample_rate)
-        self.delay_buffer = np.zeros(self.delay_frames, np.float32)
-        self.delay_time_start_index = self.delay_frames - int(self.delay_time * self.sample_rate)
+        self.delay_line = DelayLine(self.delay_frames, self.frames_per_chunk)
+        self.delay_time = 0.1
         self.wet_gain = 0.5 
+        self.feedback = None
+        self._silent_frames = 0 # frames since the input went silent
 
     def __iter__(self):
         self.signal_iter = iter(self.subcomponents[0])
+        self._delayed_signal = np.zeros(self.frames_per_chunk, np.float32)
+        self._feedback_signal = np.zeros(self.frames_per_chunk, np.float32)
         return self
     
-    def __next__(self):
-        (mix, props) = next(self.signal_iter)
+    def process(self, mix):
+        props = self.signal_iter.process(mix)
+        return self.render_from(mix, ((mix, props),))
+
+    def render_from(self, mix, sources):
+        (_, props) = sources[0]
+        if props.get("silent", False):
+            if self._silent_frames >= self.tail_frames:
+                self._props["amp"] = 0.0
+                self._props["silent"] = True
+                return self._props
+            self._silent_frames += len(mix)
+            if self._silent_frames >= self.tail_frames:
+                self.delay_line.clear() # whatever is left is below the threshold
+        else:
+            self._silent_frames = 0
         amp = props["amp"]
+        feedback_signal = mix
         
         # Add the delayed signal to the mix
         if self.delay_time > 0:
-            delayed_signal = self.delay_buffer[self.delay_time_start_index: self.delay_time_start_index + self.frames_per_chunk]
-            while len(delayed_signal) < self.frames_per_chunk:
-                # self.log.debug(f"Had to wrap around the delay buffer")
-                delayed_signal = np.concatenate((delayed_signal, self.delay_buffer[:self.frames_per_chunk - len(delayed_signal)]))
-            
-            delayed_signal *= self.wet_gain
+            delayed_signal = self.delay_line.read(self._delay_time_frames, self._delayed_signal[:len(mix)])
+            if self.feedback is not None:
+                feedback_signal = self._feedback_signal[:len(mix)]
+                np.multiply(delayed_signal, np.float32(self.feedback), out=feedback_signal)
+                feedback_signal += mix
+
+            delayed_signal *= np.float32(self.wet_gain)
             amp += self.wet_gain
             mix += delayed_signal
 
         # make sure the signal is between -1 and 1
         if amp > 1.0:
             # self.log.debug(f"Normalizing signal with amp {amp}")
-            mix = mix / amp
+            mix /= np.float32(amp)
             amp = 1.0
 
-        # Add the current signal to the delay buffer
-        self.delay_buffer = np.roll(self.delay_buffer, -self.frames_per_chunk)
-        self.delay_buffer[self.delay_frames - self.frames_per_chunk: self.delay_frames] = mix
+        # Add the current signal to the delay line
+        self.delay_line.write(feedback_signal)
 
         # Update the amplitude
         self._props["amp"] = amp
+        self._props["silent"] = False
 
-        return (mix, self._props)
-
-
+        return self._props
     
     def __deepcopy__(self, memo):
-        return Delay(self.sample_rate, self.frames_per_chunk, subcomponents=[deepcopy(sub, memo) for sub in self.subcomponents], delay_buffer_length=self.delay_buffer_length)
+        delay = Delay(self.sample_rate, self.frames_per_chunk, subcomponents=[deepcopy(sub, memo) for sub in self.subcomponents], name=self.name, delay_buffer_length=self.delay_buffer_length)
+        delay.delay_time = self.delay_time
+        delay.wet_gain = self.wet_gain
+        delay.feedback = self.feedback
+        return delay
     
+    @property
+    def tail_frames(self):
+        """
+        How long the echoes keep sounding after the input goes silent: enough repeats of the delay time
+        for them to decay below SILENCE_THRESHOLD, plus a chunk
+        """
+        decay = self.wet_gain if self.feedback is None else abs(self.feedback)
+        if decay >= 1.0:
+            return math.inf
+        repeats = 1 if decay <= 0.0 else math.ceil(math.log(Component.SILENCE_THRESHOLD) / math.log(decay)) + 1
+        return int(repeats * self._delay_time_frames) + self.frames_per_chunk
+
     @property
     def delay_time(self):
         return self._delay_time
@@ -63,4 +108,4 @@ class Delay(Component):
     @delay_time.setter
     def delay_time(self, value):
         self._delay_time = float(value)
-        self.delay_time_start_index = self.delay_frames - int(self.delay_time * self.sample_rate)
+        self._delay_time_frames = self._delay_time * self.sample_rate
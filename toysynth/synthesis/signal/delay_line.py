@@ -0,0 +1,120 @@
+import logging
+
+import numpy as np
+
+class DelayLine():
+    """
+    A circular delay line with a moving write head.
+
+    Writing a chunk and reading a tap both cost O(chunk size), no matter how long the line is.
+    Taps can be read at fractional delays (linearly interpolated between the two nearest frames),
+    and any number of taps can be summed from one line.
+
+    With num_channels set, the line holds that many independent signals of the same length
+    (e.g. one per voice), and chunks are (num_channels x frames) arrays. Passing rows (an index array or slice)
+    reads or writes only those channels, and chunks are (rows x frames); the other channels are left as they are.
+
+    A chunk is read before the chunk covering the same frames is written, so a tap can't be shorter than
+    the chunk being read. Shorter delays are clamped to the chunk length.
+    """
+    def __init__(self, length, frames_per_chunk, num_channels=None):
+        self.log = logging.getLogger(__name__)
+        self.length = int(length)
+        self.frames_per_chunk = int(frames_per_chunk)
+        self.num_channels = num_channels
+        shape = (self.length,) if num_channels is None else (num_channels, self.length)
+        self.buffer = np.zeros(shape, dtype=np.float32)
+        self.write_index = 0
+        scratch_shape = (self.frames_per_chunk + 1,) if num_channels is None else (num_channels, self.frames_per_chunk + 1)
+        self._scratch = np.zeros(scratch_shape, dtype=np.float32)
+        self._tap = np.zeros(scratch_shape[:-1] + (self.frames_per_chunk,), dtype=np.float32)
+
+    def clear(self, rows=None):
+        if rows is None:
+            self.buffer.fill(0.0)
+        else:
+            self.buffer[rows] = 0.0
+
+    def write(self, chunk, rows=None):
+        """
+        Write a chunk at the write head and advance it
+        """
+        if rows is None or isinstance(rows, slice):
+            self.write_frames(self.buffer[... if rows is None else rows], chunk)
+        else:
+            # One channel at a time: indexing the line with an index array would copy
+            for (row, row_chunk) in zip(rows, chunk):
+                self.write_frames(self.buffer[row], row_chunk)
+        self.write_index = (self.write_index + chunk.shape[-1]) % self.length
+
+    def write_frames(self, buffer, chunk):
+        num_frames = chunk.shape[-1]
+        end_index = self.write_index + num_frames
+        if end_index <= self.length:
+            buffer[..., self.write_index:end_index] = chunk
+        else:
+            first_frames = self.length - self.write_index
+            buffer[..., self.write_index:] = chunk[..., :first_frames]
+            buffer[..., :num_frames - first_frames] = chunk[..., first_frames:]
+
+    def copy_from(self, start_index, out, rows=None):
+        """
+        Copy out.shape[-1] frames starting at start_index into out, wrapping around the end of the line
+        """
+        if rows is None or isinstance(rows, slice):
+            self.copy_frames(self.buffer[... if rows is None else rows], start_index, out)
+        else:
+            for (row, row_out) in zip(rows, out):
+                self.copy_frames(self.buffer[row], start_index, row_out)
+
+    def copy_frames(self, buffer, start_index, out):
+        num_frames = out.shape[-1]
+        end_index = start_index + num_frames
+        if end_index <= self.length:
+            out[...] = buffer[..., start_index:end_index]
+        else:
+            first_frames = self.length - start_index
+            out[..., :first_frames] = buffer[..., start_index:]
+            out[..., first_frames:] = buffer[..., :num_frames - first_frames]
+
+    def clamp_delay(self, delay_frames, num_frames):
+        return min(max(float(delay_frames), num_frames), self.length - 1)
+
+    def read(self, delay_frames, out, rows=None):
+        """
+        Fill out with the signal delayed by delay_frames (which can be fractional), relative to the next chunk to be written
+        """
+        num_frames = out.shape[-1]
+        delay_frames = self.clamp_delay(delay_frames, num_frames)
+        whole_frames = int(delay_frames)
+        fraction = np.float32(delay_frames - whole_frames)
+
+        # Read one extra frame before the tap to interpolate with
+        scratch = self._scratch[..., :num_frames + 1] if rows is None else self._scratch[:out.shape[0], :num_frames + 1]
+        self.copy_from((self.write_index - whole_frames - 1) % self.length, scratch, rows)
+        if fraction == 0:
+            out[...] = scratch[..., 1:]
+        else:
+            np.multiply(scratch[..., 1:], np.float32(1.0) - fraction, out=out)
+            scratch[..., :num_frames] *= fraction
+            out += scratch[..., :num_frames]
+        return out
+
+    def add_tap(self, delay_frames, gain, out):
+        """
+        Add the signal delayed by delay_frames and scaled by gain to out
+        """
+        tap = self._tap[..., :out.shape[-1]]
+        self.read(delay_frames, tap)
+        tap *= np.float32(gain)
+        out += tap
+        return out
+
+    def read_taps(self, taps, out):
+        """
+        Fill out with the sum of a list of (delay_frames, gain) taps
+        """
+        out.fill(0.0)
+        for (delay_frames, gain) in taps:
+            self.add_tap(delay_frames, gain, out)
+        return out
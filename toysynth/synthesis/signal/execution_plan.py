@@ -0,0 +1,115 @@
+import logging
+
+import numpy as np
+
+from .component import Component
+
+class ExecutionPlan():
+    """
+    A component tree compiled into a flat list of steps, run in order on preassigned buffers.
+
+    Components that implement render_from are rendered from the chunks their subcomponents already rendered,
+    so rendering the tree doesn't recurse. Anything else (e.g. generators) is rendered with process().
+    Steps are in the order the iterator tree would run them (prepare() on the way down, render on the way up),
+    so the plan renders exactly the same samples. process(out) runs them in one flat loop.
+
+    Buffers are assigned when the plan is compiled. An in_place component renders in the buffer of its only
+    subcomponent, so a chain of effects shares one buffer; every subcomponent of a Mixer gets a scratch buffer.
+    The tree can be a DAG: a component that feeds several others is rendered once into its own buffer,
+    and every in_place component it feeds starts from a copy of its chunk and props.
+    """
+    def __init__(self, root: Component, frames_per_chunk):
+        self.log = logging.getLogger(__name__)
+        self.frames_per_chunk = frames_per_chunk
+        self.steps = [] # (node, function, buffer, sources). buffer is None for prepare steps
+        self.buffers = [None] # scratch buffers. Buffer 0 is the out passed to process()
+        self.nodes = [] # the component rendered by every node, in step order
+        self._visited = {} # id(component) -> (node, buffer)
+        self._consumers = {}
+        self.count_consumers(root)
+        (self.root_node, _) = self.visit(root, 0)
+
+    @staticmethod
+    def supports(component):
+        return len(getattr(component, "subcomponents", [])) > 0 and type(component).render_from is not Component.render_from
+
+    def count_consumers(self, component):
+        for subcomponent in getattr(component, "subcomponents", []):
+            self._consumers[id(subcomponent)] = self._consumers.get(id(subcomponent), 0) + 1
+            if self._consumers[id(subcomponent)] == 1:
+                self.count_consumers(subcomponent)
+
+    def new_buffer(self):
+        self.buffers.append(np.zeros(self.frames_per_chunk, np.float32))
+        return len(self.buffers) - 1
+
+    def add_node(self, component, function, buffer, sources):
+        self.nodes.append(component)
+        node = len(self.nodes) - 1
+        self.steps.append((node, function, buffer, sources))
+        return node
+
+    def visit(self, component, buffer):
+        """
+        Emit the steps that render component into buffer, or into a new buffer if buffer is None.
+        Returns the (node, buffer) the component's chunk ends up in.
+        """
+        if (visited := self._visited.get(id(component))) is not None:
+            return visited
+        if buffer is None:
+            buffer = self.new_buffer()
+
+        if not ExecutionPlan.supports(component):
+            node = self.add_node(component, component.process, buffer, None)
+        else:
+            if type(component).prepare is not Component.prepare:
+                self.steps.append((None, component.prepare, None, None))
+            if component.in_place:
+                source = component.subcomponents[0]
+                shared = self._consumers.get(id(source), 0) > 1
+                (source_node, source_buffer) = self.visit(source, None if shared else buffer)
+                if source_buffer != buffer:
+                    source_node = self.add_node(source, ExecutionPlan.copy_source, buffer, ((source_buffer, source_node),))
+                sources = ((buffer, source_node),)
+            else:
+                sources = tuple((source_buffer, source_node) for (source_node, source_buffer) in
+                                (self.visit(source, None) for source in component.subcomponents))
+            node = self.add_node(component, component.render_from, buffer, sources)
+
+        self._visited[id(component)] = (node, buffer)
+        return (node, buffer)
+
+    @staticmethod
+    def copy_source(out, sources):
+        (chunk, props) = sources[0]
+        np.copyto(out, chunk)
+        return dict(props)
+
+    def process(self, out):
+        """
+        Run every step on out and the scratch buffers, cut to the length of out. Returns the root's props
+        """
+        num_frames = len(out)
+        if num_frames == self.frames_per_chunk:
+            views = [out, *self.buffers[1:]]
+        else:
+            views = [out, *(buffer[:num_frames] for buffer in self.buffers[1:])]
+        props = [None] * len(self.nodes)
+        for (node, function, buffer, sources) in self.steps:
+            if buffer is None:
+                function()
+            elif sources is None:
+                props[node] = function(views[buffer])
+            else:
+                props[node] = function(views[buffer], tuple((views[b], props[n]) for (b, n) in sources))
+        return props[self.root_node]
+
+    def __str__(self):
+        lines = []
+        for (node, function, buffer, sources) in self.steps:
+            if buffer is None:
+                lines.append(f"prepare {function.__self__.name}")
+            else:
+                inputs = ", ".join(f"#{n}@{b}" for (b, n) in sources) if sources is not None else ""
+                lines.append(f"#{node} {self.nodes[node].name}.{function.__name__}({inputs}) -> buffer {buffer}")
+        return "\n".join(lines)
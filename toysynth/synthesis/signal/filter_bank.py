@@ -0,0 +1,59 @@
+import logging
+from typing import List
+
+import numpy as np
+
+from .biquad import Biquad
+from .low_pass_filter import LowPassFilter
+
+class FilterBank():
+    """
+    Runs a group of LowPassFilters (e.g. the last stage of every voice) as one 2-D filter.
+
+    Each filter in the bank skips filtering in its own process(). Instead the caller renders the voices
+    into the rows of a (voices x frames) block and calls process() on the block, which filters it
+    along the frame axis, in place, with one Biquad call per distinct cutoff. Usually every voice has the same cutoff,
+    so the filter costs one SciPy call per chunk no matter how many voices there are.
+    The filter states are stored contiguously in the bank while the filters are attached.
+    """
+    def __init__(self, filters: List[LowPassFilter]):
+        self.log = logging.getLogger(__name__)
+        self.filters = filters
+        self.zi = np.array([lpf.zi for lpf in self.filters], dtype=np.float64)
+        self.biquad = Biquad(len(self.filters), self.filters[0].frames_per_chunk if self.filters else 0)
+        for (i, lpf) in enumerate(self.filters):
+            lpf.filter_bank = self
+            lpf.bank_index = i
+
+    def process(self, block, rows=None):
+        """
+        Filter a (rows x frames) block in place, row i with filter i.
+        Pass a list of rows to filter a block of only those filters, row i with filter rows[i].
+        The other filters keep their state.
+        """
+        filters = range(len(self.filters)) if rows is None else rows
+        groups = {}
+        for (position, i) in enumerate(filters):
+            groups.setdefault(self.filters[i].current_cutoff, []).append(position)
+
+        if len(groups) == 1:
+            lpf = self.filters[filters[0]]
+            return self.biquad.process(lpf.b, lpf.a, block, self.zi, rows)
+
+        # Filters gliding to a new cutoff at different speeds. Their rows aren't next to each other, so they're filtered in a copy
+        for positions in groups.values():
+            group = [filters[position] for position in positions]
+            lpf = self.filters[group[0]]
+            rows_block = block[positions]
+            self.biquad.process(lpf.b, lpf.a, rows_block, self.zi, group)
+            block[positions] = rows_block
+        return block
+
+    def detach(self):
+        """
+        Hand the filter states back to the filters, which go back to filtering their own chunks
+        """
+        for (i, lpf) in enumerate(self.filters):
+            lpf.zi = self.zi[i].copy()
+            lpf.filter_bank = None
+        self.filters = []
@@ -11,6 +11,8 @@ class Gain(Component):
     """
     A gain component multiplies the amplitude of the signal by a constant factor.
     """
+    in_place = True
+
     def __init__(self, sample_rate, frames_per_chunk, signal_type: SignalType, subcomponents: List['Component'] = [], name="Gain", control_tag="gain"):
         super().__init__(sample_rate, frames_per_chunk, signal_type, subcomponents, name)
         self.log = logging.getLogger(__name__)
@@ -21,10 +23,21 @@ class Gain(Component):
         self.subcomponent_iter = iter(self.subcomponents[0])
         return self
     
-    def __next__(self):
-        (chunk, props) = next(self.subcomponent_iter)
+    def process(self, out):
+        props = self.subcomponent_iter.process(out)
+        return self.render_from(out, ((out, props),))
+
+    def render_from(self, out, sources):
+        (_, props) = sources[0]
         props["amp"] *= self.amp
-        return (chunk * self.amp, props)
+        if props.get("silent", False):
+            return props
+        if self.amp == 0.0:
+            out.fill(0.0)
+            props["silent"] = True
+        else:
+            out *= np.float32(self.amp)
+        return props
     
     def __deepcopy__(self, memo):
         return Gain(self.sample_rate, self.frames_per_chunk, self.signal_type, subcomponents=[deepcopy(self.subcomponents[0], memo)], name=self.name, control_tag=self.control_tag)
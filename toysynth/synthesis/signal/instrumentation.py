@@ -0,0 +1,196 @@
+import logging
+import json
+import threading
+from time import perf_counter_ns
+
+from .component import Component
+
+class Histogram():
+    """
+    A fixed size, log scale histogram of durations in nanoseconds.
+    Every power of two is split into 4 bins, so percentiles are accurate to within 25%.
+    Count, total and max are exact.
+    """
+    SUB_BIN_BITS = 2
+    NUM_BINS = 65 << SUB_BIN_BITS
+
+    def __init__(self):
+        self.counts = [0] * Histogram.NUM_BINS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        bits = ns.bit_length()
+        if bits > 2:
+            index = (bits << 2) | ((ns >> (bits - 3)) & 3)
+        else:
+            index = max(ns, 0)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    @staticmethod
+    def bin_upper_bound(index):
+        bits = index >> Histogram.SUB_BIN_BITS
+        if bits <= Histogram.SUB_BIN_BITS:
+            return index + 1
+        sub_bin = index & 3
+        return (5 + sub_bin) << (bits - Histogram.SUB_BIN_BITS - 1)
+
+    def percentile(self, p):
+        """
+        Returns the upper bound of the bin containing the p-th percentile (0 < p <= 100)
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, int(self.count * p / 100 + 0.5))
+        seen = 0
+        for (index, count) in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(Histogram.bin_upper_bound(index), self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * Histogram.NUM_BINS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def summary(self):
+        return {
+            "total_ms": self.total / 1e6,
+            "mean_us": (self.total / self.count / 1e3) if self.count > 0 else 0.0,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+
+class ComponentStats():
+    """
+    Render times of one position in the signal chain, shared by every voice's component at that position.
+    'inclusive' covers the whole __next__ call, 'exclusive' leaves out the time spent in subcomponents.
+    Voices can be rendered on several threads, so recording is guarded by a lock.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.inclusive = Histogram()
+        self.exclusive = Histogram()
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return self.inclusive.count
+
+    def record(self, inclusive_ns, exclusive_ns):
+        with self._lock:
+            self.inclusive.record(inclusive_ns)
+            self.exclusive.record(exclusive_ns)
+
+    def reset(self):
+        with self._lock:
+            self.inclusive.reset()
+            self.exclusive.reset()
+
+    def summary(self):
+        return {"calls": self.calls, "inclusive": self.inclusive.summary(), "exclusive": self.exclusive.summary()}
+
+
+class ComponentProfiler():
+    """
+    Opt-in render time instrumentation for a component tree.
+
+    instrument() swaps the class of every component in the tree for a subclass whose __next__ and process
+    time the call, and uninstrument() swaps it back, so components that aren't instrumented pay nothing at all.
+    """
+    _instrumented_classes = {}
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.stats = {}
+
+    @staticmethod
+    def get_instrumented_class(cls):
+        if (instrumented := ComponentProfiler._instrumented_classes.get(cls)) is not None:
+            return instrumented
+
+        def timed(method):
+            def wrapper(self, *args):
+                stack = self._profiler_stack
+                stack.append(0)
+                start = perf_counter_ns()
+                try:
+                    return method(self, *args)
+                finally:
+                    elapsed = perf_counter_ns() - start
+                    subcomponent_time = stack.pop()
+                    if stack:
+                        stack[-1] += elapsed
+                    self._profiler_stats.record(elapsed, elapsed - subcomponent_time)
+            return wrapper
+
+        # Only time the method the class actually renders with. The other one calls it, and would count every chunk twice
+        if cls.process is Component.process:
+            attributes = {"__next__": timed(cls.__next__), "_uninstrumented_class": cls}
+        else:
+            attributes = {"process": timed(cls.process), "_uninstrumented_class": cls}
+        instrumented = type(cls.__name__, (cls,), attributes)
+        ComponentProfiler._instrumented_classes[cls] = instrumented
+        return instrumented
+
+    def instrument(self, component, path=None, stack=None):
+        """
+        Instrument a component and all of its subcomponents.
+        Components are identified by their class and position in the tree, so identical trees (i.e. voices)
+        share their stats.
+        Every tree gets its own stack for tracking time spent in subcomponents, so separate trees can be
+        rendered from separate threads.
+        """
+        cls = getattr(component, "_uninstrumented_class", type(component))
+        path = cls.__name__ if path is None else path
+        if path not in self.stats:
+            self.stats[path] = ComponentStats(path)
+        stack = [] if stack is None else stack
+        component._profiler_stack = stack
+        component._profiler_stats = self.stats[path]
+        component.__class__ = ComponentProfiler.get_instrumented_class(cls)
+
+        subcomponents = getattr(component, "subcomponents", [])
+        for (i, subcomponent) in enumerate(subcomponents):
+            sub_name = getattr(subcomponent, "_uninstrumented_class", type(subcomponent)).__name__
+            index = f"[{i}]" if len(subcomponents) > 1 else ""
+            self.instrument(subcomponent, f"{path}/{sub_name}{index}", stack)
+
+    @staticmethod
+    def uninstrument(component):
+        if (cls := getattr(component, "_uninstrumented_class", None)) is not None:
+            component.__class__ = cls
+        for subcomponent in getattr(component, "subcomponents", []):
+            ComponentProfiler.uninstrument(subcomponent)
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.reset()
+
+    def report(self):
+        """
+        Returns a dict of component path -> call count and timing summary
+        """
+        return {path: stats.summary() for (path, stats) in self.stats.items()}
+
+    def log_report(self):
+        lines = [f"{'component':<60} {'calls':>8} {'self p50':>10} {'self p99':>10} {'self max':>10} {'total p99':>10} {'self total':>12}"]
+        for (path, stats) in self.stats.items():
+            exclusive = stats.exclusive.summary()
+            inclusive = stats.inclusive.summary()
+            lines.append(f"{path:<60} {stats.calls:>8} {exclusive['p50_us']:>8.1f}us {exclusive['p99_us']:>8.1f}us {exclusive['max_us']:>8.1f}us {inclusive['p99_us']:>8.1f}us {exclusive['total_ms']:>10.1f}ms")
+        self.log.info("Component render times:\n" + "\n".join(lines))
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        self.log.info(f"Wrote component render times to {path}")
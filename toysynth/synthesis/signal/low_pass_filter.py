@@ -2,12 +2,24 @@ import logging
 from copy import deepcopy
 
 import numpy as np
-from scipy.signal import butter, lfilter, lfilter_zi
+from scipy.signal import lfilter_zi
 
 from .component import Component
 from .signal_type import SignalType
+from .butterworth_table import ButterworthTable
+from .biquad import Biquad
 
 class LowPassFilter(Component):
+    """
+    A low pass Butterworth filter.
+    Coefficients come from a ButterworthTable shared by every filter with the same order and sample rate,
+    so changing the cutoff never designs a filter. A cutoff change glides to the new value over about
+    smoothing_time seconds, with the coefficients updated once per chunk, so knob moves don't click.
+    When the input is silent the filter only runs until its state has decayed below SILENCE_THRESHOLD.
+    The chunk is filtered in place by a Biquad.
+    """
+    in_place = True
+
     def __init__(self, sample_rate, frames_per_chunk, source: Component, cutoff_frequency: float, filter_order: int = 2, name="LowPassFilter"):
         super().__init__(sample_rate, frames_per_chunk, signal_type=SignalType.WAVE, name=name)
         self.log = logging.getLogger(__name__)
@@ -15,13 +27,19 @@ class LowPassFilter(Component):
         self.add_subcomponent(source)
         self.filter_order = filter_order
         self.sample_rate = sample_rate
+        self.table = ButterworthTable.get(self.filter_order, self.sample_rate)
+        self.smoothing_time = 0.02
+        self._current_cutoff = None
         self.cutoff_frequency = cutoff_frequency
-        self.b, self.a = self.compute_coefficients()
         self.zi = self.compute_initial_conditions()
+        self.biquad = Biquad(1, frames_per_chunk)
+        self.filter_bank = None # set while a FilterBank does the filtering for this filter
+        self.bank_index = None
         self._props["amp"] = 0.0
 
     @property
     def cutoff_frequency(self):
+        """The target cutoff frequency. The filter glides towards it from its current cutoff"""
         return self._cutoff_frequency
     
     @cutoff_frequency.setter
@@ -31,15 +49,26 @@ class LowPassFilter(Component):
             if float_val < 0.0:
                 raise ValueError("Cutoff frequency must be positive.")
             self._cutoff_frequency = float_val
-            self.b, self.a = self.compute_coefficients()
+            if self._current_cutoff is None:
+                self._current_cutoff = float_val
+                self.b, self.a = self.compute_coefficients()
         except ValueError:
             self.log.error(f"Couldn't set with value {value}")
 
+    @property
+    def current_cutoff(self):
+        """The cutoff the filter is at right now, while gliding towards cutoff_frequency"""
+        return self._current_cutoff
+
     def compute_coefficients(self):
-        nyquist = 0.5 * self.sample_rate
-        normalized_cutoff = self.cutoff_frequency / nyquist
-        b, a = butter(self.filter_order, normalized_cutoff, btype='low', analog=False)
-        return b, a
+        return self.table.coefficients(self._current_cutoff)
+
+    def update_cutoff(self, num_frames):
+        """
+        Move the current cutoff towards the target by num_frames worth of smoothing, and look up its coefficients
+        """
+        self._current_cutoff = ButterworthTable.smooth_cutoff(self._current_cutoff, self._cutoff_frequency, num_frames, self.smoothing_time * self.sample_rate)
+        self.b, self.a = self.compute_coefficients()
 
     def compute_initial_conditions(self):
         zi = lfilter_zi(self.b, self.a)
@@ -49,10 +78,26 @@ class LowPassFilter(Component):
         self.source_iter = iter(self.subcomponents[0])
         return self
 
-    def __next__(self):
-        (input_signal, props) = next(self.source_iter)
-        output_signal, self.zi = lfilter(self.b, self.a, input_signal, zi=self.zi)
-        return (output_signal.astype(np.float32), props)
+    def process(self, out):
+        props = self.source_iter.process(out)
+        return self.render_from(out, ((out, props),))
+
+    def render_from(self, out, sources):
+        (_, props) = sources[0]
+        if self._current_cutoff != self._cutoff_frequency:
+            self.update_cutoff(len(out))
+        if self.filter_bank is not None:
+            # The bank filters this chunk together with the rest of the bank, and its state may still ring
+            props["silent"] = False
+            return props
+        silent = props.get("silent", False)
+        if silent and not self.zi.any():
+            return props
+        self.biquad.process(self.b, self.a, out.reshape(1, -1), self.zi)
+        if silent and np.abs(self.zi).max() < Component.SILENCE_THRESHOLD:
+            self.zi.fill(0.0) # rung out, so the next silent chunk is skipped
+        props["silent"] = False
+        return props
 
     def __deepcopy__(self, memo):
         return LowPassFilter(self.sample_rate, self.frames_per_chunk, deepcopy(self.subcomponents[0], memo), self.cutoff_frequency, self.filter_order)
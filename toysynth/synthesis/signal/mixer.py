@@ -14,27 +14,51 @@ class Mixer(Component):
 
     def __iter__(self):
         self.subcomponent_iters = [iter(sub) for sub in self.subcomponents]
+        self._chunk = np.zeros(self.frames_per_chunk, np.float32)
 
         return self
     
-    def __next__(self):
-        mix = np.zeros(self.frames_per_chunk, np.float32)
+    def process(self, out):
+        out.fill(0.0)
         amp = 0.0
         num_active_voices = 0
 
+        silent = True
+
+        chunk = self._chunk[:len(out)]
         for sub in self.subcomponent_iters:
-            (chunk, props) = next(sub)
-            mix += chunk
+            props = sub.process(chunk)
+            if not props.get("silent", False):
+                out += chunk
+                silent = False
             chunk_amp = props["amp"]
             if chunk_amp != 0:
                 amp += chunk_amp
                 num_active_voices += 1
-        
+        return self.finish(out, amp, num_active_voices, silent)
+
+    def render_from(self, out, sources):
+        out.fill(0.0)
+        amp = 0.0
+        num_active_voices = 0
+        silent = True
+        for (chunk, props) in sources:
+            if not props.get("silent", False):
+                out += chunk
+                silent = False
+            chunk_amp = props["amp"]
+            if chunk_amp != 0:
+                amp += chunk_amp
+                num_active_voices += 1
+        return self.finish(out, amp, num_active_voices, silent)
+
+    def finish(self, out, amp, num_active_voices, silent):
         component_amp = (amp / num_active_voices) if num_active_voices > 0 else np.float32(0.0)
         self._props["amp"] = component_amp
-        if amp > 1:
-            mix = self.normalize_signal(mix)
-        return (mix, self._props)
+        self._props["silent"] = silent
+        if amp > 1 and not silent:
+            self.normalize_signal_in_place(out)
+        return self._props
     
     def __deepcopy__(self, memo):
         return Mixer(self.sample_rate, self.frames_per_chunk, subcomponents=[deepcopy(sub, memo) for sub in self.subcomponents])
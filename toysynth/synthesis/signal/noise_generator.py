@@ -11,20 +11,25 @@ class NoiseGenerator(Generator):
         super().__init__(sample_rate, frames_per_chunk, signal_type=SignalType.WAVE, name=name)
         self.log = logging.getLogger(__name__)
         self._props["amp"] = 1.0
+        self._rng = np.random.default_rng()
 
 
     def __iter__(self):
         return super().__iter__()
     
-    def __next__(self):
+    def process(self, out):
         if self.active:
-            rng = np.random.default_rng()
-            noise = rng.uniform(-1.0, 1.0, self.frames_per_chunk)
+            # uniform in [-1.0, 1.0)
+            self._rng.random(dtype=np.float32, out=out)
+            out *= 2.0
+            out -= 1.0
             self._props["amp"] = 1.0
-            return (noise.astype(np.float32), self._props)
+            self._props["silent"] = False
         else:
             self._props["amp"] = 0.0
-            return (np.zeros(self.frames_per_chunk, dtype=np.float32), self._props)
+            self._props["silent"] = True
+            out.fill(0.0)
+        return self._props
     
     def __deepcopy__(self, memo):
         return NoiseGenerator(self.sample_rate, self.frames_per_chunk)
\ No newline at end of file
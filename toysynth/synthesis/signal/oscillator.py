@@ -13,6 +13,32 @@ class Oscillator(Generator):
         self.phase = 0.0
         self.amplitude = 1.0
 
+    def __iter__(self):
+        self._phase_accumulator = 0.0
+        self._frame_offsets = np.arange(self.frames_per_chunk, dtype=np.float64)
+        self._phases = np.zeros(self.frames_per_chunk, dtype=np.float64)
+        return self
+
+    def next_phases(self, num_frames=None):
+        """
+        Fill the phase buffer with the phase of every frame in the next chunk (or the next num_frames frames)
+        and advance the accumulator.
+        Phases are measured in cycles and wrapped to [0, 1), so they never lose precision no matter how long
+        the oscillator runs. A frequency change takes effect from the current phase, so the wave stays continuous.
+        The accumulator and the phases are kept in double precision, so long held notes at high sample rates
+        don't drift in pitch or quantize their phase; only the rendered chunk is converted to float32.
+        The returned array is reused on every call, and can be scaled in place before it's copied into the chunk:
+        np.copyto converts it without the temporary buffer a float64 ufunc with a float32 out allocates.
+        """
+        num_frames = self.frames_per_chunk if num_frames is None else num_frames
+        phases = self._phases[:num_frames]
+        increment = self.frequency / self.sample_rate
+        np.multiply(self._frame_offsets[:num_frames], increment, out=phases)
+        phases += self._phase_accumulator
+        np.mod(phases, 1.0, out=phases)
+        self._phase_accumulator = (self._phase_accumulator + increment * num_frames) % 1.0
+        return phases
+
     @property
     def type(self):
         """The Oscillator Type"""
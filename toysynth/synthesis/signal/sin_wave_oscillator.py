@@ -10,31 +10,26 @@ class SinWaveOscillator(Oscillator):
         super().__init__(sample_rate, frames_per_chunk, name=name)
         self.log = logging.getLogger(__name__)
 
-    def __iter__(self):
-        self._wave = np.zeros(self.frames_per_chunk)
-        self._chunk_duration = self.frames_per_chunk / self.sample_rate
-        self._chunk_start_time = 0.0
-        self._chunk_end_time = self._chunk_duration
-        return self
-    
-    def __next__(self):
+    def process(self, out):
         # Generate the wave
         if not self.active or self.frequency <= 0.0:
             if self.frequency < 0.0:
                 self.log.error("Overriding negative frequency to 0")
             self._props["amp"] = 0.0
-            self._wave = np.zeros(self.frames_per_chunk)
+            self._props["silent"] = True
+            out.fill(0.0)
         
         else:
             self._props["amp"] = self.amplitude
-            ts = np.linspace(self._chunk_start_time, self._chunk_end_time, self.frames_per_chunk, endpoint=False)
-            self._wave = self.amplitude * np.sin(self.phase + (2 * np.pi * self.frequency) * ts)
-
-        # Update the state variables for next time
-        self._chunk_start_time = self._chunk_end_time
-        self._chunk_end_time += self._chunk_duration
-
-        return (self._wave.astype(np.float32), self._props)
+            self._props["silent"] = False
+            phases = self.next_phases(len(out))
+            phases *= 2 * np.pi
+            phases += self.phase
+            np.sin(phases, out=phases)
+            phases *= self.amplitude
+            np.copyto(out, phases, casting="same_kind")
+
+        return self._props
     
     def __deepcopy__(self, memo):
         return SinWaveOscillator(self.sample_rate, self.frames_per_chunk)
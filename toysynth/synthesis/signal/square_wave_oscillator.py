@@ -10,11 +10,12 @@ class SquareWaveOscillator(SinWaveOscillator):
         super().__init__(sample_rate, frames_per_chunk)
         self.log = logging.getLogger(__name__)
 
-    def __next__(self):
-        (sin_wave, props) = super().__next__()
-        square_wave = np.sign(sin_wave)
-        # self.print_chunk(square_wave)
-        return (square_wave, props)
+    def process(self, out):
+        props = super().process(out)
+        if not props["silent"]:
+            np.sign(out, out=out)
+        # self.print_chunk(out)
+        return props
     
     def __deepcopy__(self, memo):
         return SquareWaveOscillator(self.sample_rate, self.frames_per_chunk)
\ No newline at end of file
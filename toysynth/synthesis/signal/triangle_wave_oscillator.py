@@ -12,10 +12,14 @@ class TriangleWaveOscillator(SawtoothWaveOscillator):
     def __iter__(self):
         return super().__iter__()
 
-    def __next__(self):
-        (sawtooth, props) = super().__next__()
-        triangle = (abs(sawtooth) - 0.5) * 2
-        return (triangle, props)
+    def process(self, out):
+        props = super().process(out)
+        if props["silent"]:
+            return props
+        np.abs(out, out=out)
+        out -= 0.5
+        out *= 2
+        return props
 
     def __deepcopy__(self, memo):
         return TriangleWaveOscillator(self.sample_rate, self.frames_per_chunk, name="TriWaveOscillator")
\ No newline at end of file
@@ -1,84 +1,207 @@
 import logging
 import threading
+import multiprocessing
 from copy import deepcopy
-import hashlib
 from enum import Enum
+from time import perf_counter
 
 import numpy as np
 
-from toysynth.communication import Mailbox
+from toysynth.communication import Mailbox, Event, EventType
 import toysynth.synthesis.signal as signal
 import toysynth.midi as midi
-from toysynth.playback import PyAudioStreamPlayer
-import toysynth.synthesis.signal.utils as utils
+from toysynth.playback import PyAudioStreamPlayer, RenderAheadBuffer, PolyphaseResampler
+from .voice_bank import VoiceBank
+from .sample_clock import SampleClock
+from .event_scheduler import EventScheduler
+from .voice_allocator import VoiceAllocator
+from .render_pool import RenderPool
+from .voice_thread_pool import VoiceThreadPool
 
 class Synthesizer(threading.Thread):
     class Mode(Enum):
         MONO = 0
         POLY = 1
 
-    def __init__(self, mailbox: Mailbox, sample_rate: int, frames_per_chunk: int, num_voices=8) -> None:
+    class Engine(Enum):
+        CHAIN = 0 # every voice pulls its own copy of the signal chain
+        VOICE_BANK = 1 # all voices are rendered together by a VoiceBank
+        PROCESS_POOL = 2 # chain engine voices rendered on a pool of worker processes
+
+    # Controllers that just set a parameter, so only the last value in a chunk matters
+    COALESCED_CCS = frozenset(range(70, 78))
+
+    def __init__(self, mailbox: Mailbox, sample_rate: int, frames_per_chunk: int, num_voices=8, engine=Engine.CHAIN, render_ahead_chunks=0, batch_filters=True, steal_policy=VoiceAllocator.StealPolicy.RELEASED_FIRST, render_workers=0, render_threads=0, thread_min_frames=2048, output_sample_rate=0, output_frames_per_chunk=0) -> None:
         super().__init__(name="Synthesizer")
         self.log = logging.getLogger(__name__)
         self.mailbox = mailbox
         self.sample_rate = sample_rate
         self.frames_per_chunk = frames_per_chunk
+        # The audio device's rate and chunk size. The voices render at sample_rate, and are resampled to it if it's different.
+        # Pass the device's chunk size: deriving it back from frames_per_chunk can be a frame off (1024 at 44100 Hz renders
+        # in chunks of 372 at 16000 Hz, which is 1025 at 44100 Hz)
+        self.output_sample_rate = output_sample_rate or sample_rate
+        self.output_frames_per_chunk = output_frames_per_chunk or round(frames_per_chunk * self.output_sample_rate / sample_rate)
+        self.clock = SampleClock(self.sample_rate) # frames rendered since start
+        self.scheduler = EventScheduler()
+        self.chunk_anchor = None # (frame, perf_counter time) of the last chunk rendered while playing live
+        self.realtime = False
+        self.events_applied = 0
+        self.events_coalesced = 0
         self.signal_chain_prototype = self.setup_signal_chain()
         self.log.info(f"Signal Chain Prototype:\n{str(self.signal_chain_prototype)}")
-        self.voices = [Voice(deepcopy(self.signal_chain_prototype)) for _ in range(num_voices)]
+        self.engine = engine
+        self.voice_bank = None
+        self.render_pool = None
+        if self.engine == Synthesizer.Engine.VOICE_BANK:
+            self.voice_bank = VoiceBank(self.sample_rate, self.frames_per_chunk, num_voices)
+            self.voices = [BankVoice(self.voice_bank, i) for i in range(num_voices)]
+        elif self.engine == Synthesizer.Engine.PROCESS_POOL:
+            self.render_pool = RenderPool(self.sample_rate, self.frames_per_chunk, num_voices, render_workers or multiprocessing.cpu_count(), batch_filters)
+            self.voices = [PoolVoice(self.render_pool, i) for i in range(num_voices)]
+        else:
+            self.voices = [Voice(deepcopy(self.signal_chain_prototype), i) for i in range(num_voices)]
+        self._voice_chunk = np.zeros(self.frames_per_chunk, np.float32)
+        self._voice_block = np.zeros((len(self.voices), self.frames_per_chunk), np.float32) # one row per rendered voice
+        self._output_buffers = [np.zeros(self.frames_per_chunk, np.float32) for _ in range(2)] # double buffered, see generator()
+        self.voice_allocator = VoiceAllocator(self.voices, steal_policy)
+        # Indexes of the chain engine voices that are rendered. Every voice starts out rendering, so the initial
+        # filter states ring out, and drops out once it's idle. note on adds the voice back.
+        self.active_voices = set(range(num_voices))
+        self.filter_bank = self.setup_filter_bank() if self.engine == Synthesizer.Engine.CHAIN and batch_filters else None
+        self.voice_thread_pool = VoiceThreadPool(render_threads, thread_min_frames) if self.engine == Synthesizer.Engine.CHAIN and render_threads > 1 else None
         self.cutoff_vals = np.logspace(4, 14, 128, endpoint=True, base=2, dtype=np.float32) # 2^14=16384 : that is the highest possible cutoff value
         self.envelope_adr_vals = np.logspace(0, 1, 128, endpoint=True, base=10, dtype=np.float32) - 1 # range is from 0-9
         logspaced = np.logspace(0, 1, 128, endpoint=True, dtype=np.float32) # range is from 1-10
         self.envelope_s_vals = (logspaced - 1) / (10 - 1) # range is from 0-1
         self.delay_times = 0.5 * np.logspace(0, 2, 128, endpoint=True, base=2, dtype=np.float32) - 0.5 # range is from 0 - 6
         self.osc_mix_vals = np.linspace(0, 1, 128, endpoint=True, dtype=np.float32)
-        self.stream_player = PyAudioStreamPlayer(sample_rate, frames_per_chunk, self.generator())
+        self.stream_player = None # created when the thread starts, so the synth can also render without an audio device
+        self.render_ahead_chunks = render_ahead_chunks # 0 renders inside the audio callback
+        self.render_ahead_buffer = None
         self.mode = Synthesizer.Mode.POLY
         self.control_change_handler = self.cc_bank_a_handler
+        self.event_handlers = {
+            EventType.NOTE_ON: self.handle_note_on,
+            EventType.NOTE_OFF: self.handle_note_off,
+            EventType.CONTROL_CHANGE: self.handle_control_change,
+            EventType.PROGRAM_CHANGE: self.handle_program_change,
+        }
         self.set_gain_a(0.5)
         self.set_gain_b(0.5) # TODO should this be in setup signal chain?
         self.mono_stacks = [[] for _ in range(num_voices)]
+        self.profiler = None
         
 
     def run(self):
+        source = self.output_generator()
+        if self.render_ahead_chunks > 0:
+            self.render_ahead_buffer = RenderAheadBuffer(source, self.output_frames_per_chunk, self.render_ahead_chunks)
+            self.render_ahead_buffer.prefill()
+            self.render_ahead_buffer.start()
+            source = self.render_ahead_buffer
+        self.stream_player = PyAudioStreamPlayer(self.output_sample_rate, self.output_frames_per_chunk, source)
+        self.realtime = True
         self.stream_player.play()
         should_run = True
         while should_run and self.stream_player.is_active():
             # get() is a blocking call
-            if message := self.mailbox.get(): 
-                match message.split():
-                    case ["exit"]:
-                        self.log.info("Got exit command.")
-                        self.stream_player.stop()
-                        should_run = False
-                    case ["note_on", "-n", note, "-c", channel]:
-                        int_note = int(note)
-                        chan = int(channel)
-                        note_name = midi.note_names[int_note]
-                        if chan < len(self.voices):
-                            self.note_on(int_note, chan)
-                            # self.log.info(f"Note on {note_name} ({int_note}), chan {chan}")
-                    case ["note_off", "-n", note, "-c", channel]:
-                        int_note = int(note)
-                        chan = int(channel)
-                        note_name = midi.note_names[int(note)]
-                        if chan < len(self.voices):
-                            self.note_off(int_note, chan)
-                            # self.log.info(f"Note off {note_name} ({int_note}), chan {chan}")
-                    case ["control_change", "-c", channel, "-n", cc_num, "-v", control_val]:
-                        self.control_change_handler(channel, cc_num, control_val)
-                    case ["program_change", "-c", channel, "-n", program_num]:
-                        self.log.info(f"Received PC : {message}")
-                        if channel == "9" and program_num == "0":
-                            if self.control_change_handler == self.cc_bank_a_handler:
-                                self.control_change_handler = self.cc_bank_b_handler
-                                self.log.info(f"Set control change handler to bank B")
-                            else:
-                                self.control_change_handler = self.cc_bank_a_handler
-                                self.log.info(f"Set control change handler to bank A")
-                    case _:
-                        self.log.info(f"Matched unknown command: {message}")
+            if mail := self.mailbox.get(): 
+                if isinstance(mail, Event):
+                    self.schedule_event(mail)
+                elif mail.split() == ["exit"]:
+                    self.log.info("Got exit command.")
+                    self.stream_player.stop()
+                    if self.render_ahead_buffer is not None:
+                        self.render_ahead_buffer.stop()
+                        self.render_ahead_buffer.join()
+                        self.log.info(f"Render ahead buffer: {self.render_ahead_buffer.stats()}")
+                    self.log.info(f"Events: {self.event_stats()}")
+                    self.close()
+                    should_run = False
+                elif (event := Event.parse(mail)) is not None:
+                    self.schedule_event(event)
+                else:
+                    self.handle_message(mail)
         return
+
+    def close(self):
+        """
+        Stop the render workers and threads, if the synth has any
+        """
+        if self.render_pool is not None:
+            self.log.info(f"Render workers: {self.render_pool.stats()}")
+            self.render_pool.close()
+            self.render_pool = None
+        if self.voice_thread_pool is not None:
+            self.log.info(f"Render threads: {self.voice_thread_pool.stats()}")
+            self.voice_thread_pool.close()
+            self.voice_thread_pool = None
+
+    def schedule_event(self, event: Event):
+        """
+        Schedule an event on the frame it should be heard, from the perf_counter time it was received at.
+        The chunk that was being rendered when the event arrived starts playing about one chunk later,
+        so every event is delayed by exactly one chunk instead of jittering up to one chunk to the next boundary.
+        Events without a timestamp are timed now.
+        """
+        timestamp = event.timestamp if event.timestamp is not None else perf_counter()
+        if (anchor := self.chunk_anchor) is None:
+            frame = self.clock.frame
+        else:
+            (anchor_frame, anchor_time) = anchor
+            frame = anchor_frame + self.frames_per_chunk + int((timestamp - anchor_time) * self.sample_rate)
+        self.scheduler.schedule(frame, event)
+
+    def handle_event(self, event: Event):
+        """
+        Apply a single controller event to the synth
+        """
+        self.event_handlers[event.type](event)
+
+    def handle_note_on(self, event: Event):
+        if event.channel < len(self.voices) and event.data1 < len(midi.frequencies):
+            self.note_on(event.data1, event.channel)
+
+    def handle_note_off(self, event: Event):
+        if event.channel < len(self.voices):
+            self.note_off(event.data1, event.channel)
+
+    def handle_control_change(self, event: Event):
+        self.control_change_handler(event.channel, event.data1, event.data2)
+
+    def handle_program_change(self, event: Event):
+        self.log.debug(f"Received PC : {event}")
+        if event.channel == 9 and event.data1 == 0:
+            if self.control_change_handler == self.cc_bank_a_handler:
+                self.control_change_handler = self.cc_bank_b_handler
+                self.log.debug(f"Set control change handler to bank B")
+            else:
+                self.control_change_handler = self.cc_bank_a_handler
+                self.log.debug(f"Set control change handler to bank A")
+
+    def handle_message(self, message):
+        """
+        Apply a text message to the synth: either the text form of an event, or a command
+        """
+        if (event := Event.parse(message)) is not None:
+            self.handle_event(event)
+            return
+        match message.split():
+            case ["profile"]:
+                if self.profiler is not None:
+                    self.profiler.log_report()
+                else:
+                    self.log.info("Component instrumentation is not enabled")
+                if self.render_ahead_buffer is not None:
+                    self.log.info(f"Render ahead buffer: {self.render_ahead_buffer.stats()}")
+                self.log.info(f"Events: {self.event_stats()}")
+                if self.render_pool is not None:
+                    self.log.info(f"Render workers: {self.render_pool.stats()}")
+                if self.voice_thread_pool is not None:
+                    self.log.info(f"Render threads: {self.voice_thread_pool.stats()}")
+            case _:
+                self.log.info(f"Matched unknown command: {message}")
     
     @property
     def mode(self):
@@ -88,10 +211,15 @@ class Synthesizer(threading.Thread):
     @mode.setter
     def mode(self, val):
         try:
-            if isinstance(val, Synthesizer.Mode):
-                self._mode = val
-            else:
+            if not isinstance(val, Synthesizer.Mode):
                 raise ValueError
+            if getattr(self, "_mode", val) != val:
+                # Voices are assigned differently in each mode, so start the new mode from released voices
+                self.all_notes_off()
+                for stack in self.mono_stacks:
+                    stack.clear()
+                self.voice_allocator.resync()
+            self._mode = val
         except ValueError:
             self.log.debug(f"Couldn't set Synthesizer mode with value {val}")
 
@@ -117,69 +245,208 @@ class Synthesizer(threading.Thread):
         signal_chain = signal.Chain(self.sample_rate, self.frames_per_chunk, lpf)
         return iter(signal_chain)
     
+    def setup_filter_bank(self):
+        """
+        Filter every voice's chunk in one batched call, if every voice's chain ends in a LowPassFilter
+        """
+        filters = [voice.signal_chain.subcomponents[0] for voice in self.voices]
+        if not all(isinstance(lpf, signal.LowPassFilter) for lpf in filters):
+            self.log.warning("Can't batch the voice filters because the signal chain doesn't end in a LowPassFilter")
+            return None
+        return signal.FilterBank(filters)
+
     def generator(self):
-        mix = np.zeros(self.frames_per_chunk, np.float32)
-        num_active_voices = 0
+        """
+        Yields the chunks the stream player plays.
+        Every chunk is rendered and clipped into one of two preallocated float32 output buffers, in turn, and the buffer
+        itself is yielded. PortAudio reads the samples straight out of its memory, so the output path doesn't allocate or
+        copy, and the chunk from the last next() stays intact while the next one renders.
+        """
+        if self.voice_bank is not None:
+            render = self.render_voice_bank # all voices are rendered in one batched pass
+        elif self.render_pool is not None:
+            render = self.render_pool.render
+        else:
+            render = self.render_voices
+        output_buffers = self._output_buffers
+        buffer_index = 0
         while True:
-            amp = np.float32(0.0)
-            for i in range(len(self.voices)):
-                voice = self.voices[i]
-                (next_chunk, props) = next(voice.signal_chain)
-                mix += next_chunk
-                chunk_amp = props["amp"]
-                amp += chunk_amp
-                if chunk_amp != 0: # if the chunk isn't all 0s that means it's active
-                    # self.log.debug(f"Voice {i} is active")
-                    num_active_voices += 1
-
-            # if num_active_voices != 0:
-            #     mix = mix / num_active_voices
-            # self.log.debug(f"amp: {amp}")
-            if amp > 1:
-                utils.normalize(mix)
-            
-            mix.clip(-1.0, 1.0)
-            
+            mix = output_buffers[buffer_index]
+            buffer_index ^= 1
+            mix.fill(0.0)
+            self.render_chunk(mix, render)
+            np.clip(mix, -1.0, 1.0, out=mix)
             yield mix
-            mix = np.zeros(self.frames_per_chunk, np.float32)
-            num_active_voices = 0
 
-    def get_note_id(self, note: int, chan: int):
+    def output_generator(self):
         """
-        Generate an id for a given note and channel
-        By hashing the note and channel we can ensure that we are turning off the exact note
-        that was turned on
+        The generator's chunks at the output rate: resampled if the voices render at a different rate than the device runs at
         """
-        note_id = hash(f"{note}{chan}")
-        return note_id
-    
+        if self.output_sample_rate == self.sample_rate and self.output_frames_per_chunk == self.frames_per_chunk:
+            return self.generator()
+        return PolyphaseResampler(self.generator(), self.sample_rate, self.output_sample_rate, self.output_frames_per_chunk)
+
+    def render_chunk(self, mix, render):
+        """
+        Render the next chunk into mix with render(out), which renders every voice into out.
+        The chunk is split at the frame of every event due in it, and each event is applied right on its frame.
+        Every piece is rendered on its own, so the Mixer and Delay amp normalization is applied per piece with the
+        amp of that piece, not once for the whole chunk. A chunk with events can come out slightly different from
+        the same chunk rendered whole, but the gain follows the notes that are actually sounding in each piece.
+        An event whose handler fails is logged and skipped, so a bad event can't stop the audio.
+        """
+        chunk_start = self.clock.frame
+        if self.realtime:
+            self.chunk_anchor = (chunk_start, perf_counter())
+        start = 0
+        for (offset, event) in self.coalesce_events(self.scheduler.pop_due(chunk_start, chunk_start + self.frames_per_chunk)):
+            self.events_applied += 1
+            if offset > start:
+                render(mix[start:offset])
+                start = offset
+            try:
+                self.handle_event(event)
+            except Exception as e:
+                self.log.error(f"Couldn't apply {event!r}: {e!r}")
+        render(mix[start:])
+        self.clock.advance(self.frames_per_chunk)
+
+    def coalesce_events(self, due):
+        """
+        Drop every control change in a chunk's events that is followed by another one for the same channel and controller,
+        so a fast knob sweep only updates the voices once per chunk. Notes and everything else are kept in order.
+        """
+        last_cc = {}
+        num_ccs = 0
+        for (i, (_, event)) in enumerate(due):
+            if event.type == EventType.CONTROL_CHANGE and event.data1 in Synthesizer.COALESCED_CCS:
+                last_cc[(event.channel, event.data1)] = i
+                num_ccs += 1
+        if num_ccs == len(last_cc):
+            return due
+
+        coalesced = [(offset, event) for (i, (offset, event)) in enumerate(due)
+                     if event.type != EventType.CONTROL_CHANGE
+                     or event.data1 not in Synthesizer.COALESCED_CCS
+                     or last_cc[(event.channel, event.data1)] == i]
+        self.events_coalesced += len(due) - len(coalesced)
+        return coalesced
+
+    def event_stats(self):
+        return {
+            "events_applied": self.events_applied,
+            "events_coalesced": self.events_coalesced,
+            "late_events": self.scheduler.late_events,
+        }
+
+    def render_voices(self, out):
+        """
+        Render the active voices into out. Idle voices aren't rendered at all
+        """
+        if self.voice_thread_pool is not None and self.voice_thread_pool.should_split(len(self.active_voices), len(out)):
+            self.render_voices_threaded(out)
+            return
+        if self.filter_bank is not None:
+            self.render_voices_batched(out)
+            return
+        voice_chunk = self._voice_chunk[:len(out)]
+        for index in sorted(self.active_voices):
+            voice = self.voices[index]
+            props = voice.signal_chain.process(voice_chunk)
+            out += voice_chunk
+            voice.amp = props["amp"]
+            if voice.update_idle(voice_chunk):
+                self.deactivate_voice(voice)
+
+    def render_voices_batched(self, out):
+        """
+        Render the active voices into the first rows of the voice block, in voice order, then filter those rows at once
+        """
+        rows = sorted(self.active_voices)
+        block = self._voice_block[:len(rows), :len(out)]
+        for (position, row) in enumerate(rows):
+            voice = self.voices[row]
+            props = voice.signal_chain.process(block[position])
+            voice.amp = props["amp"]
+        self.filter_bank.process(block, None if len(rows) == len(self.voices) else rows)
+        np.sum(block, axis=0, out=out)
+        for (position, row) in enumerate(rows):
+            if self.voices[row].update_idle(block[position]):
+                self.deactivate_voice(self.voices[row])
+
+    def render_voices_threaded(self, out):
+        """
+        Render groups of the active voices into their rows of the voice block on the voice thread pool,
+        then filter (if the filters are batched) and sum the rows in voice order, like the single threaded renders
+        """
+        rows = sorted(self.active_voices)
+        block = self._voice_block[:len(rows), :len(out)]
+        self.voice_thread_pool.map(lambda group: self.render_voice_rows(group, block), list(enumerate(rows)), deadline=len(out) / self.sample_rate)
+        if self.filter_bank is not None:
+            self.filter_bank.process(block, None if len(rows) == len(self.voices) else rows)
+        np.sum(block, axis=0, out=out)
+        for (position, row) in enumerate(rows):
+            if self.voices[row].update_idle(block[position]):
+                self.deactivate_voice(self.voices[row])
+
+    def render_voice_rows(self, positions, block):
+        """
+        Render a group of (position in the block, voice index) pairs
+        """
+        for (position, row) in positions:
+            voice = self.voices[row]
+            props = voice.signal_chain.process(block[position])
+            voice.amp = props["amp"]
+
+    def deactivate_voice(self, voice):
+        """
+        Stop rendering an idle voice. Its components keep their state until the next note on
+        """
+        self.active_voices.discard(voice.index)
+        voice.amp = 0.0
+        voice.quiet_frames = 0
+
+    def render_voice_bank(self, out):
+        self.voice_bank.render(len(out), out)
+
+    def enable_instrumentation(self, profiler: signal.ComponentProfiler):
+        """
+        Time every component of every voice's signal chain with the given profiler
+        """
+        if self.engine != Synthesizer.Engine.CHAIN:
+            self.log.warning("Component instrumentation is only available with the chain engine")
+            return
+        self.profiler = profiler
+        for voice in self.voices:
+            voice.signal_chain.compiled = False # the profiler times the tree of iterators
+            self.profiler.instrument(voice.signal_chain)
+
+    def disable_instrumentation(self):
+        for voice in self.voices:
+            if self.engine == Synthesizer.Engine.CHAIN:
+                signal.ComponentProfiler.uninstrument(voice.signal_chain)
+                voice.signal_chain.compiled = True
+        self.profiler = None
+
     def note_on_mono(self, note: int, chan: int):
         """
         Handle note on for mono mode
         Add the note to the mono stack and turn it on
         """
-        note_id = self.get_note_id(note, chan)
-        # self.log.debug(f"[mono] Setting voice {chan} note_on with note {note}, id {note_id}")
+        # self.log.debug(f"[mono] Setting voice {chan} note_on with note {note}")
         self.mono_stacks[chan].append(note)
         freq = midi.frequencies[note]
-        self.voices[chan].note_on(freq, note_id)
+        self.voices[chan].note_on(freq, (note, chan))
+        self.active_voices.add(chan)
     
     def note_on_poly(self, note: int, chan: int):
-        note_id = self.get_note_id(note, chan)
-        freq = midi.frequencies[note]
-        for i in range(len(self.voices)):
-            voice = self.voices[i]
-            if not voice.active:
-                # self.log.debug(f"[poly] Setting voice {i} note_on with note {note}, id {note_id}")
-                voice.note_on(freq, note_id)
-                self.voices.append(self.voices.pop(i)) # Move this voice to the back of the list. It should be popped last
-                break
-
-            if i == len(self.voices) - 1:
-                self.log.debug(f"Had no unused voices!")
-                self.voices[0].note_off()
-                self.voices[0].note_on(freq, note_id)
-                self.voices.append(self.voices.pop(0))
+        """
+        Handle note on for poly mode
+        The voice allocator picks a free voice, or steals one if they're all sounding
+        """
+        voice = self.voice_allocator.note_on(note, chan)
+        voice.note_on(midi.frequencies[note], (note, chan))
+        self.active_voices.add(voice.index)
 
 
     def note_on(self, note: int, chan: int):
@@ -201,8 +468,7 @@ class Synthesizer(threading.Thread):
         then turn it off and pop the note from the mono stack, then turn on the last note in the stack.
         Otherwise, just remove the note from the mono stack.
         """
-        note_id = self.get_note_id(note, chan)
-        if self.voices[chan].id == note_id:
+        if self.voices[chan].id == (note, chan):
             popped = self.mono_stacks[chan].pop()
             if popped != note:
                 self.log.debug(f"Note {note} was not the same as the note that was popped {popped}")
@@ -218,141 +484,275 @@ class Synthesizer(threading.Thread):
 
 
     def note_off_poly(self, note: int, chan: int):
-        note_id = self.get_note_id(note, chan)
-        for i in range(len(self.voices)):
-            voice = self.voices[i]
-            if voice.active and voice.id == note_id:
-                # self.log.debug(f"Setting voice {i} note_off with id {note_id}")
-                voice.note_off()
+        if (voice := self.voice_allocator.note_off(note, chan)) is not None:
+            voice.note_off()
     
     def all_notes_off(self):
         for voice in self.voices:
             voice.note_off()
+        self.voice_allocator.all_notes_off()
 
     def set_attack(self, attack):
+        if self.voice_bank is not None:
+            self.voice_bank.attack = attack
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_attack", attack)
+            return
         for voice in self.voices:
             voice.signal_chain.set_attack(attack)
 
     def set_decay(self, decay):
+        if self.voice_bank is not None:
+            self.voice_bank.decay = decay
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_decay", decay)
+            return
         for voice in self.voices:
             voice.signal_chain.set_decay(decay)
 
     def set_sustain(self, sustain):
+        if self.voice_bank is not None:
+            self.voice_bank.sustain = sustain
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_sustain", sustain)
+            return
         for voice in self.voices:
             voice.signal_chain.set_sustain(sustain)
 
     def set_release(self, release):
+        if self.voice_bank is not None:
+            self.voice_bank.release = release
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_release", release)
+            return
         for voice in self.voices:
             voice.signal_chain.set_release(release)
     
     def set_cutoff_frequency(self, cutoff):
+        if self.voice_bank is not None:
+            self.voice_bank.cutoff_frequency = cutoff
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_cutoff_frequency", cutoff)
+            return
         for voice in self.voices:
             voice.signal_chain.set_filter_cutoff(cutoff)
 
     def set_delay_time(self, delay_time):
+        if self.voice_bank is not None:
+            self.voice_bank.delay_time = delay_time
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_delay_time", delay_time)
+            return
         for voice in self.voices:
             voice.signal_chain.set_delay_time(delay_time)
+            voice.refresh_tail_frames()
 
     def set_delay_wet_gain(self, wet_gain):
+        if self.voice_bank is not None:
+            self.voice_bank.wet_gain = wet_gain
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_delay_wet_gain", wet_gain)
+            return
         for voice in self.voices:
             voice.signal_chain.set_delay_wet_gain(wet_gain)
 
     def set_gain_a(self, gain):
+        if self.voice_bank is not None:
+            self.voice_bank.set_gain_by_control_tag(self.gain_a_ctrl_tag, gain)
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_gain_a", gain)
+            return
         for voice in self.voices:
             voice.signal_chain.set_gain_by_control_tag(self.gain_a_ctrl_tag, gain)
 
     def set_gain_b(self, gain):
+        if self.voice_bank is not None:
+            self.voice_bank.set_gain_by_control_tag(self.gain_b_ctrl_tag, gain)
+            return
+        if self.render_pool is not None:
+            self.render_pool.call("set_gain_b", gain)
+            return
         for voice in self.voices:
             voice.signal_chain.set_gain_by_control_tag(self.gain_b_ctrl_tag, gain)
 
-    def cc_bank_a_handler(self, channel, cc_num, control_val):
-        if cc_num == "20":
-            cc_val = int(control_val)
+    def cc_bank_a_handler(self, channel, cc_num, cc_val):
+        """
+        Control changes are applied in the audio callback, so the handlers only log at debug level
+        """
+        if cc_num == 20:
             if cc_val != 0 and self.mode == Synthesizer.Mode.MONO:
                 self.mode = Synthesizer.Mode.POLY
-                self.log.info(f"Set synth mode to POLY")
+                self.log.debug(f"Set synth mode to POLY")
             elif cc_val != 0:
                 self.mode = Synthesizer.Mode.MONO
-                self.log.info(f"Set synth mode to MONO")
-        elif cc_num == "21":
-            cc_val = int(control_val)
+                self.log.debug(f"Set synth mode to MONO")
+        elif cc_num == 21:
             if cc_val != 0:
                 self.all_notes_off()
-                self.log.info(f"Turned off all notes")
-        elif cc_num == "70":
-            cc_val = int(control_val)
+                self.log.debug(f"Turned off all notes")
+        elif cc_num == 70:
             lookup_val = self.envelope_adr_vals[cc_val]
             self.set_attack(lookup_val)
-            self.log.info(f"Attack: {lookup_val}")
-        elif cc_num == "71":
-            cc_val = int(control_val)
+            self.log.debug(f"Attack: {lookup_val}")
+        elif cc_num == 71:
             lookup_val = self.envelope_adr_vals[cc_val]
             self.set_decay(lookup_val)
-            self.log.info(f"Decay: {lookup_val}")
-        elif cc_num == "72":
-            cc_val = int(control_val)
+            self.log.debug(f"Decay: {lookup_val}")
+        elif cc_num == 72:
             lookup_val = self.envelope_s_vals[cc_val]
             self.set_sustain(lookup_val)
-            self.log.info(f"Sustain: {lookup_val}")
-        elif cc_num == "73":
-            cc_val = int(control_val)
+            self.log.debug(f"Sustain: {lookup_val}")
+        elif cc_num == 73:
             lookup_val = self.envelope_adr_vals[cc_val]
             self.set_release(lookup_val)
-            self.log.info(f"Release: {lookup_val}")
-        elif cc_num == "74":
-            chan = int(channel)
-            cc_val = int(control_val)
+            self.log.debug(f"Release: {lookup_val}")
+        elif cc_num == 74:
             self.set_cutoff_frequency(self.cutoff_vals[cc_val])
-            self.log.info(f"LPF Cutoff: {self.cutoff_vals[cc_val]}")
-        elif cc_num == "75":
-            cc_val = int(control_val)
+            self.log.debug(f"LPF Cutoff: {self.cutoff_vals[cc_val]}")
+        elif cc_num == 75:
             gain_a_mix_val = self.osc_mix_vals[cc_val]
             gain_b_mix_val = 1 - gain_a_mix_val
             self.set_gain_a(gain_a_mix_val)
             self.set_gain_b(gain_b_mix_val)
-            self.log.info(f"Gain A: {gain_a_mix_val}")
-            self.log.info(f"Gain B: {gain_b_mix_val}")
-        elif cc_num == "76":
-            chan = int(channel)
-            cc_val = int(control_val)
+            self.log.debug(f"Gain A: {gain_a_mix_val}")
+            self.log.debug(f"Gain B: {gain_b_mix_val}")
+        elif cc_num == 76:
             self.set_delay_time(self.delay_times[cc_val])
-            self.log.info(f"Delay Time: {self.delay_times[cc_val]}")
-        elif cc_num == "77":
-            chan = int(channel)
-            cc_val = int(control_val)
+            self.log.debug(f"Delay Time: {self.delay_times[cc_val]}")
+        elif cc_num == 77:
             self.set_delay_wet_gain(self.envelope_s_vals[cc_val]) # range is 0 - 1
-            self.log.info(f"Delay Wet Gain: {self.envelope_s_vals[cc_val]}")
-        elif cc_num == "126":
+            self.log.debug(f"Delay Wet Gain: {self.envelope_s_vals[cc_val]}")
+        elif cc_num == 126:
             self.mode = Synthesizer.Mode.MONO
-            self.log.info(f"Set synth mode to MONO")
-        elif cc_num == "127":
+            self.log.debug(f"Set synth mode to MONO")
+        elif cc_num == 127:
             self.mode = Synthesizer.Mode.POLY
-            self.log.info(f"Set synth mode to POLY")
+            self.log.debug(f"Set synth mode to POLY")
         else:
-            self.log.info(f"Unhandled control change: CC {cc_num} with value {control_val} on channel {channel}")
+            self.log.debug(f"Unhandled control change: CC {cc_num} with value {cc_val} on channel {channel}")
 
     def cc_bank_b_handler(self, channel, cc_num, control_val):
-        self.log.info(f"Unhandled control change: CC {cc_num} with value {control_val} on channel {channel}")
+        self.log.debug(f"Unhandled control change: CC {cc_num} with value {control_val} on channel {channel}")
 
 
 class Voice:
-    def __init__(self, signal_chain: signal.Chain):
+    IDLE_THRESHOLD = 1e-4 # -80 dBFS
+
+    def __init__(self, signal_chain: signal.Chain, index=0):
         self.signal_chain = iter(signal_chain)
+        self.index = index
         self._active = False
         self.id = None
+        self.amp = 0.0 # the envelope level at the end of the last rendered chunk, set by the synth
+        self.quiet_frames = 0
+        self._tail_frames = 0
+        self._tail_generation = None
 
     @property
     def active(self):
-        # Update the active status based on the is_silent() method of the ADSR envelope
-        # Yeah it's kinda janks but it works. 
-        if self._active and self.signal_chain.is_silent():
-            self._active = False
+        """
+        True from note on until the voice has gone idle, i.e. through the release and the delay tail, see update_idle()
+        """
         return self._active
 
     def note_on(self, frequency, id):
         self._active = True
         self.id = id
+        self.quiet_frames = 0
         self.signal_chain.note_on(frequency)
 
     def note_off(self):
         self.signal_chain.note_off()
+
+    @property
+    def tail_frames(self):
+        """
+        How long the output has to stay below IDLE_THRESHOLD after the envelope ends before the voice is idle.
+        That's longer than the delay time, so every echo still in the delay line has been read back out,
+        plus a chunk for the filter to ring out.
+        Cached, and looked up again when the chain's tree changes or refresh_tail_frames() is called.
+        """
+        if self._tail_generation != self.signal_chain.tree_generation:
+            self.refresh_tail_frames()
+        return self._tail_frames
+
+    def refresh_tail_frames(self):
+        delay_time = max((delay.delay_time for delay in self.signal_chain.get_components_by_class(signal.Delay)), default=0.0)
+        self._tail_frames = int(delay_time * self.signal_chain.sample_rate) + self.signal_chain.frames_per_chunk
+        self._tail_generation = self.signal_chain.tree_generation
+
+    def update_idle(self, rendered):
+        """
+        Check the output the voice just rendered. Returns True once the voice has gone idle
+        """
+        if not self.signal_chain.is_silent() or max(rendered.max(), -rendered.min()) >= Voice.IDLE_THRESHOLD:
+            self.quiet_frames = 0
+            return False
+        self.quiet_frames += len(rendered)
+        if self.quiet_frames < self.tail_frames:
+            return False
+        self._active = False
+        return True
+
+
+class BankVoice:
+    """
+    A handle to one voice of a VoiceBank. It has the same interface as Voice so the
+    note allocation logic in Synthesizer doesn't need to know which engine is in use.
+    """
+    def __init__(self, voice_bank: VoiceBank, index: int):
+        self.voice_bank = voice_bank
+        self.index = index
+        self._active = False
+        self.id = None
+
+    @property
+    def active(self):
+        if self._active and self.voice_bank.is_silent(self.index):
+            self._active = False
+        return self._active
+
+    @property
+    def amp(self):
+        return self.voice_bank.amps[self.index]
+
+    def note_on(self, frequency, id):
+        self._active = True
+        self.id = id
+        self.voice_bank.note_on(self.index, frequency)
+
+    def note_off(self):
+        self.voice_bank.note_off(self.index)
+
+
+class PoolVoice:
+    """
+    A handle to one voice rendered by a RenderPool worker, with the same interface as Voice
+    """
+    def __init__(self, render_pool: RenderPool, index: int):
+        self.render_pool = render_pool
+        self.index = index
+        self.id = None
+
+    @property
+    def active(self):
+        return bool(self.render_pool.voice_active[self.index])
+
+    @property
+    def amp(self):
+        return self.render_pool.voice_amps[self.index]
+
+    def note_on(self, frequency, id):
+        self.id = id
+        self.render_pool.note_on(self.index, frequency, id)
+
+    def note_off(self):
+        self.render_pool.note_off(self.index)
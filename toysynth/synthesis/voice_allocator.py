@@ -0,0 +1,132 @@
+import logging
+from collections import deque, OrderedDict
+from enum import Enum
+
+class VoiceAllocator():
+    """
+    Assigns voices to notes in poly mode without scanning the voice list.
+
+    Voices are in one of three places:
+    - the free list: not sounding, handed out first
+    - held: the key is down, looked up by (note, channel) for note off
+    - released: the key is up but the release (and any delay tail) may still be sounding
+
+    Held and released voices are also tracked together as sounding. Each of these is kept in order (held and
+    sounding by trigger, released by release), so the oldest voice is always at the front. When there are no free voices, released voices that went silent are moved back to the
+    free list, and if there are still none, a sounding voice is stolen according to the steal policy.
+    Keys are (note, channel) tuples, so every note and channel pair gets its own key.
+    """
+    class StealPolicy(Enum):
+        OLDEST = 0 # the voice that was triggered the longest ago
+        QUIETEST = 1 # the voice with the lowest envelope level
+        RELEASED_FIRST = 2 # the voice that was released the longest ago, or the oldest one if every key is down
+
+    def __init__(self, voices, steal_policy=StealPolicy.RELEASED_FIRST):
+        self.log = logging.getLogger(__name__)
+        self.voices = list(voices)
+        self.steal_policy = steal_policy
+        self.reset()
+
+    def reset(self):
+        self.free = deque(self.voices)
+        self.held = OrderedDict() # voice -> (note, channel), triggered the longest ago first
+        self.released = OrderedDict() # voice -> None, released the longest ago first
+        self.sounding = OrderedDict() # voice -> None, every held and released voice, triggered the longest ago first
+        self.notes = {} # (note, channel) -> voice
+        self.voices_stolen = 0
+
+    @property
+    def steal_policy(self):
+        """How a sounding voice is picked when every voice is in use"""
+        return self._steal_policy
+
+    @steal_policy.setter
+    def steal_policy(self, val):
+        try:
+            if isinstance(val, VoiceAllocator.StealPolicy):
+                self._steal_policy = val
+            else:
+                self._steal_policy = VoiceAllocator.StealPolicy[str(val).upper()]
+        except KeyError:
+            self.log.error(f"Unknown voice steal policy {val}, using RELEASED_FIRST")
+            self._steal_policy = VoiceAllocator.StealPolicy.RELEASED_FIRST
+
+    def resync(self):
+        """
+        Rebuild the state from the voices themselves, after they were played without the allocator (i.e. in mono mode).
+        Voices that are still sounding are released, the rest are free. Call it after releasing every voice.
+        """
+        self.free = deque(voice for voice in self.voices if not voice.active)
+        self.held.clear()
+        self.notes.clear()
+        self.released = OrderedDict((voice, None) for voice in self.voices if voice.active)
+        self.sounding = OrderedDict(self.released)
+
+    def note_on(self, note: int, channel: int):
+        """
+        Returns the voice that should play the note. The caller triggers it.
+        A note that's already held is retriggered on the same voice.
+        """
+        key = (note, channel)
+        if (voice := self.notes.get(key)) is not None:
+            self.held.move_to_end(voice)
+            self.sounding.move_to_end(voice)
+            return voice
+
+        if not self.free:
+            self.reclaim()
+        if self.free:
+            voice = self.free.popleft()
+        else:
+            voice = self.steal()
+            self.voices_stolen += 1
+
+        self.held[voice] = key
+        self.sounding[voice] = None
+        self.notes[key] = voice
+        return voice
+
+    def note_off(self, note: int, channel: int):
+        """
+        Returns the voice that's playing the note, or None if the note isn't held. The caller releases it.
+        """
+        if (voice := self.notes.pop((note, channel), None)) is None:
+            return None
+        del self.held[voice]
+        self.released[voice] = None
+        return voice
+
+    def all_notes_off(self):
+        for voice in self.held:
+            self.released[voice] = None
+        self.held.clear()
+        self.notes.clear()
+
+    def reclaim(self):
+        """
+        Move the released voices that went silent back to the free list
+        """
+        for voice in [voice for voice in self.released if not voice.active]:
+            del self.released[voice]
+            del self.sounding[voice]
+            self.free.append(voice)
+
+    def steal(self):
+        """
+        Take a sounding voice away from its note
+        """
+        match self.steal_policy:
+            case VoiceAllocator.StealPolicy.RELEASED_FIRST if self.released:
+                voice = next(iter(self.released))
+            case VoiceAllocator.StealPolicy.QUIETEST:
+                # Envelope levels change every chunk, so this one has to look at every sounding voice
+                voice = min(self.sounding, key=lambda voice: voice.amp)
+            case _:
+                voice = next(iter(self.sounding))
+
+        if voice in self.held:
+            del self.notes[self.held.pop(voice)]
+        else:
+            del self.released[voice]
+        del self.sounding[voice]
+        return voice
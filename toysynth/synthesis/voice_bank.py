@@ -0,0 +1,350 @@
+import logging
+import math
+from enum import IntEnum
+
+import numpy as np
+from scipy.signal import lfilter_zi
+
+from .signal import DelayLine, ButterworthTable, Biquad
+
+class VoiceBank():
+    """
+    Renders every voice of the default signal chain in one batched NumPy pass.
+
+    This mirrors the chain built by Synthesizer.setup_signal_chain:
+        (square osc * gain_a + sawtooth osc * gain_b) -> ADSR -> Delay -> LowPassFilter
+    but instead of one nested iterator tree per voice, the state of every voice lives in arrays
+    indexed by voice number, and each chunk is rendered as a (num_voices x frames_per_chunk) block.
+    The blocks are rendered in preallocated scratch buffers, so a chunk doesn't allocate any arrays of its size.
+    """
+
+    SILENCE_THRESHOLD = 1e-4 # -80 dBFS, like Component.SILENCE_THRESHOLD
+
+    class Stage(IntEnum):
+        IDLE = 0
+        ADS = 1
+        RELEASE = 2
+
+    def __init__(self, sample_rate, frames_per_chunk, num_voices, cutoff_frequency=8000.0, filter_order=2, delay_buffer_length=4.0):
+        self.log = logging.getLogger(__name__)
+        self.sample_rate = int(sample_rate)
+        self.frames_per_chunk = int(frames_per_chunk)
+        self.num_voices = int(num_voices)
+        self._frame_offsets = np.arange(self.frames_per_chunk, dtype=np.float64)
+        # Scratch blocks, used as C contiguous (sounding voices x frames) views, see block()
+        size = self.num_voices * self.frames_per_chunk
+        self._phases = np.zeros(size, dtype=np.float64)
+        self._frames = np.zeros(size, dtype=np.float64)
+        self._ads = np.zeros(size, dtype=np.float64)
+        self._stage_env = np.zeros(size, dtype=np.float64)
+        self._mask = np.zeros(size, dtype=bool)
+        self._env = np.zeros(size, dtype=np.float32)
+        self._voices = np.zeros(size, dtype=np.float32)
+        self._square = np.zeros(size, dtype=np.float32)
+        self._increment = np.zeros(self.num_voices, dtype=np.float64)
+        self._start_phase = np.zeros(self.num_voices, dtype=np.float64)
+        self._phase_step = np.zeros(self.num_voices, dtype=np.float64)
+        self._level = np.zeros(self.num_voices, dtype=np.float64)
+
+        # Oscillators. Both oscillators of a voice track the same note, so they share one phase accumulator.
+        # Phase is measured in cycles and wrapped to [0, 1).
+        self._frequency = np.zeros(self.num_voices, dtype=np.float64)
+        self._phase = np.zeros(self.num_voices, dtype=np.float64)
+        self._gains = {"gain_a": 1.0, "gain_b": 1.0}
+
+        # Envelope
+        self._gate = np.zeros(self.num_voices, dtype=bool)
+        self._stage = np.full(self.num_voices, VoiceBank.Stage.IDLE, dtype=np.int8)
+        self._stage_frames = np.zeros(self.num_voices, dtype=np.int64) # frames elapsed since the current stage was triggered
+        self._release_level = np.zeros(self.num_voices, dtype=np.float32)
+        self._env_level = np.zeros(self.num_voices, dtype=np.float32)
+        self._idle_frames = np.zeros(self.num_voices, dtype=np.int64) # frames rendered since the envelope went idle
+        self._silent = np.zeros(self.num_voices, dtype=bool) # voices that are no longer rendered
+        self.attack = 0.0
+        self.decay = 0.0
+        self.sustain = 1.0
+        self.release = 0.0
+
+        # Delay
+        self.delay_buffer_length = delay_buffer_length
+        self.delay_frames = int(self.delay_buffer_length * self.sample_rate)
+        self._delay_line = DelayLine(self.delay_frames, self.frames_per_chunk, num_channels=self.num_voices)
+        self._delayed = np.zeros((self.num_voices, self.frames_per_chunk), dtype=np.float32)
+        self.delay_time = 0.1
+        self.wet_gain = 0.5
+
+        # Filter
+        self.filter_order = filter_order
+        self._table = ButterworthTable.get(self.filter_order, self.sample_rate)
+        self.cutoff_smoothing_time = 0.02
+        self._current_cutoff = None
+        self.cutoff_frequency = cutoff_frequency
+        self._zi = np.tile(lfilter_zi(self._b, self._a), (self.num_voices, 1))
+        self._biquad = Biquad(self.num_voices, self.frames_per_chunk)
+
+    @property
+    def attack(self):
+        return self._attack
+
+    @attack.setter
+    def attack(self, value):
+        self._attack = np.float32(value)
+        self._attack_frames = int(self.sample_rate * self._attack)
+
+    @property
+    def decay(self):
+        return self._decay
+
+    @decay.setter
+    def decay(self, value):
+        self._decay = np.float32(value)
+        self._decay_frames = int(self.sample_rate * self._decay)
+
+    @property
+    def sustain(self):
+        return self._sustain
+
+    @sustain.setter
+    def sustain(self, value):
+        self._sustain = np.float32(value)
+
+    @property
+    def release(self):
+        return self._release
+
+    @release.setter
+    def release(self, value):
+        self._release = np.float32(value)
+        self._release_frames = int(self.sample_rate * self._release)
+
+    @property
+    def delay_time(self):
+        return self._delay_time
+
+    @delay_time.setter
+    def delay_time(self, value):
+        self._delay_time = float(value)
+        self._delay_time_frames = self._delay_time * self.sample_rate
+
+    @property
+    def cutoff_frequency(self):
+        return self._cutoff_frequency
+
+    @cutoff_frequency.setter
+    def cutoff_frequency(self, value):
+        try:
+            float_val = float(value)
+            if float_val < 0.0:
+                raise ValueError("Cutoff frequency must be positive.")
+            self._cutoff_frequency = float_val
+            if self._current_cutoff is None:
+                self._current_cutoff = float_val
+                self._b, self._a = self._table.coefficients(self._current_cutoff)
+        except ValueError:
+            self.log.error(f"Couldn't set with value {value}")
+
+    def set_gain_by_control_tag(self, ctrl_tag, gain):
+        try:
+            float_val = float(gain)
+            if float_val > 1.0 or float_val < 0.0:
+                raise ValueError
+            if ctrl_tag not in self._gains:
+                raise KeyError
+            self._gains[ctrl_tag] = float_val
+        except ValueError:
+            self.log.error(f"Gain must be between 0.0 and 1.0, got {gain}")
+        except KeyError:
+            self.log.error(f"No gain with control tag {ctrl_tag}")
+
+    def note_on(self, index, frequency):
+        self._frequency[index] = float(frequency)
+        self._gate[index] = True
+        self._stage[index] = VoiceBank.Stage.ADS
+        # Start the attack from the current level, like AdsrEnvelope.trigger_attack
+        peak = self.mixer_amp()
+        if peak > 0:
+            self._stage_frames[index] = int(min(self._env_level[index] / peak, 1.0) * self._attack_frames)
+        else:
+            self._stage_frames[index] = 0
+
+    def note_off(self, index):
+        if self._gate[index]:
+            self._gate[index] = False
+            self._stage[index] = VoiceBank.Stage.RELEASE
+            self._stage_frames[index] = 0
+            self._release_level[index] = self._env_level[index]
+
+    def is_silent(self, index):
+        """
+        A voice is silent once its envelope is idle and the delay tail has run out
+        """
+        return self._stage[index] == VoiceBank.Stage.IDLE and self._idle_frames[index] >= self.tail_frames
+
+    @property
+    def tail_frames(self):
+        """
+        How long a voice keeps sounding after its envelope goes idle: enough repeats of the delay time for the
+        echoes to decay below SILENCE_THRESHOLD, plus a chunk for the filter to ring out
+        """
+        if self._delay_time <= 0 or self.wet_gain <= 0:
+            return self.frames_per_chunk
+        if self.wet_gain >= 1.0:
+            return math.inf
+        repeats = math.ceil(math.log(VoiceBank.SILENCE_THRESHOLD) / math.log(self.wet_gain)) + 1
+        return int(repeats * self._delay_time_frames) + self.frames_per_chunk
+
+    @property
+    def amps(self):
+        """The envelope level of every voice at the end of the last rendered chunk"""
+        return self._env_level
+
+    def sounding_rows(self):
+        """
+        Returns the voices that have to be rendered: every voice (as a slice) if none of them is silent, otherwise
+        an index array of the ones that aren't. A voice that just went silent gets its delay line row and filter
+        state cleared, so it starts from silence when it's rendered again.
+        """
+        silent = (self._stage == VoiceBank.Stage.IDLE) & (self._idle_frames >= self.tail_frames)
+        if (went_silent := silent & ~self._silent).any():
+            self._delay_line.clear(went_silent)
+            self._zi[went_silent] = 0.0
+        self._silent = silent
+        if not silent.any():
+            return slice(None)
+        return np.flatnonzero(~silent)
+
+    @staticmethod
+    def block(buffer, num_rows, num_frames):
+        """A C contiguous (num_rows x num_frames) view of the start of a scratch buffer"""
+        return buffer[:num_rows * num_frames].reshape(num_rows, num_frames)
+
+    def render(self, num_frames=None, out=None):
+        """
+        Render the next chunk of every voice and return their sum as a float32 array of size <frames_per_chunk>.
+        Pass num_frames to render only part of a chunk, and out to render into it instead of a new array.
+        Only the voices that are still sounding are rendered. The rest are silent until their next note on.
+        """
+        n = self.frames_per_chunk if num_frames is None else num_frames
+        out = np.zeros(n, dtype=np.float32) if out is None else out
+        rows = self.sounding_rows()
+        num_rows = self.num_voices if isinstance(rows, slice) else len(rows)
+
+        # Oscillators. Silent voices keep their phase moving, so it's cheap to keep every phase up to date.
+        # Per voice values are applied a row at a time: NumPy buffers a whole block to broadcast a column over it
+        phase = VoiceBank.block(self._phases, num_rows, n)
+        increment = self._increment[:num_rows]
+        np.divide(self._frequency[rows], self.sample_rate, out=increment)
+        start_phase = self._start_phase[:num_rows]
+        np.copyto(start_phase, self._phase[rows])
+        for i in range(num_rows):
+            np.multiply(increment[i], self._frame_offsets[:n], out=phase[i])
+            phase[i] += start_phase[i]
+        np.mod(phase, 1.0, out=phase)
+        np.multiply(self._frequency, n / self.sample_rate, out=self._phase_step)
+        self._phase += self._phase_step
+        np.mod(self._phase, 1.0, out=self._phase)
+
+        # Envelope
+        env = self.render_envelope(n, rows)
+        if num_rows == 0:
+            out.fill(0.0)
+            self._delay_line.write(self._delayed[:0, :n], rows)
+            return out
+
+        mask = VoiceBank.block(self._mask, num_rows, n)
+        square = VoiceBank.block(self._square, num_rows, n)
+        np.less(phase, 0.5, out=mask)
+        square.fill(-1.0)
+        np.copyto(square, np.float32(1.0), where=mask)
+        voices = VoiceBank.block(self._voices, num_rows, n)
+        np.copyto(voices, phase, casting="same_kind")
+        voices *= 2.0
+        voices -= 1.0
+        voices *= self._gains["gain_b"]
+        square *= self._gains["gain_a"]
+        voices += square
+        voices *= env
+
+        # Delay
+        if self._delay_time > 0:
+            delayed = self._delay_line.read(self._delay_time_frames, self._delayed[:num_rows, :n], rows)
+            delayed *= self.wet_gain
+            voices += delayed
+            amp = self._env_level[rows] + self.wet_gain
+            for i in range(num_rows):
+                if amp[i] > 1.0:
+                    voices[i] *= np.float32(1.0 / amp[i])
+        self._delay_line.write(voices, rows)
+
+        # Filter, gliding towards the target cutoff like LowPassFilter does
+        if self._current_cutoff != self._cutoff_frequency:
+            self._current_cutoff = ButterworthTable.smooth_cutoff(self._current_cutoff, self._cutoff_frequency, n, self.cutoff_smoothing_time * self.sample_rate)
+            self._b, self._a = self._table.coefficients(self._current_cutoff)
+        self._biquad.process(self._b, self._a, voices, self._zi, None if isinstance(rows, slice) else rows)
+
+        return np.sum(voices, axis=0, out=out)
+
+    def render_envelope(self, n, rows=slice(None)):
+        """
+        Compute the (rows x n) envelope for the next n frames in closed form from each voice's
+        stage and the number of frames since that stage started, then advance the stage counters of every voice.
+        The frame counts are exact in float64, so the envelope comes out the same as from integer frame counts.
+        """
+        num_rows = self.num_voices if isinstance(rows, slice) else len(rows)
+        frames = VoiceBank.block(self._frames, num_rows, n)
+        stage_frames = self._stage_frames[rows]
+        for i in range(num_rows):
+            np.add(float(stage_frames[i]), self._frame_offsets[:n], out=frames[i])
+        peak = self.mixer_amp()
+        attack_frames = self._attack_frames
+        decay_frames = self._decay_frames
+        mask = VoiceBank.block(self._mask, num_rows, n)
+
+        # ads = attack until attack_frames, then decay until attack_frames + decay_frames, then sustain
+        ads = VoiceBank.block(self._ads, num_rows, n)
+        stage_env = VoiceBank.block(self._stage_env, num_rows, n)
+        np.multiply(frames, np.float32(peak / max(attack_frames, 1)), out=ads)
+        np.subtract(frames, attack_frames, out=stage_env)
+        stage_env *= np.float32((self._sustain - peak) / max(decay_frames, 1))
+        stage_env += peak
+        np.greater_equal(frames, attack_frames + decay_frames, out=mask)
+        np.copyto(stage_env, self._sustain, where=mask)
+        np.greater_equal(frames, attack_frames, out=mask)
+        np.copyto(ads, stage_env, where=mask)
+
+        # release ramps down from the level the envelope was at on note off
+        release = stage_env
+        np.divide(frames, max(self._release_frames, 1), out=release)
+        np.subtract(1.0, release, out=release)
+        np.maximum(release, 0.0, out=release)
+        level = self._level[:num_rows]
+        np.copyto(level, self._release_level[rows])
+        for i in range(num_rows):
+            release[i] *= level[i]
+
+        env = VoiceBank.block(self._env, num_rows, n)
+        stage = self._stage[rows]
+        for i in range(num_rows):
+            if stage[i] == VoiceBank.Stage.ADS:
+                np.copyto(env[i], ads[i], casting="same_kind")
+            elif stage[i] == VoiceBank.Stage.RELEASE:
+                np.copyto(env[i], release[i], casting="same_kind")
+            else:
+                env[i].fill(0.0)
+
+        self._env_level[rows] = env[:, -1]
+        self._stage_frames += n
+        self._idle_frames += n
+        self._idle_frames[self._stage != VoiceBank.Stage.IDLE] = 0
+        finished = (self._stage == VoiceBank.Stage.RELEASE) & (self._stage_frames >= self._release_frames)
+        self._stage[finished] = VoiceBank.Stage.IDLE
+        self._env_level[finished] = 0.0
+        return env
+
+    def mixer_amp(self):
+        """
+        The amplitude reported by the oscillator Mixer: the average of the non-zero oscillator gains.
+        The envelope ramps up to this level during the attack stage.
+        """
+        gains = [gain for gain in self._gains.values() if gain != 0]
+        return sum(gains) / len(gains) if len(gains) > 0 else 0.0
@@ -0,0 +1,92 @@
+import logging
+import threading
+import queue
+from time import perf_counter
+
+class VoiceThreadPool():
+    """
+    Runs groups of voice renders on a pool of persistent threads.
+
+    NumPy and SciPy release the GIL inside their array kernels (multiplies, lfilter, ...), so voices rendered
+    on different threads overlap for the part of their time spent in those kernels. The calling thread renders
+    the first group itself and the helper threads render the rest, so num_threads threads render in total.
+
+    Dispatching to the threads costs a few context switches, which small renders don't win back.
+    should_split() only hands out work when every thread gets at least min_frames_per_thread voice frames
+    (voices times frames) to render.
+    A render waits for every group, but counts a missed deadline if that takes longer than the deadline it was given.
+    """
+    def __init__(self, num_threads, min_frames_per_thread=2048):
+        self.log = logging.getLogger(__name__)
+        self.num_threads = max(1, num_threads)
+        self.min_frames_per_thread = min_frames_per_thread
+        self._done = queue.SimpleQueue()
+        self._tasks = [queue.SimpleQueue() for _ in range(self.num_threads - 1)]
+        self.threads = [threading.Thread(target=self.run_worker, args=(tasks,), name=f"VoiceRenderer{i + 1}", daemon=True)
+                        for (i, tasks) in enumerate(self._tasks)]
+        for thread in self.threads:
+            thread.start()
+        self.dispatches = 0
+        self.missed_deadlines = 0
+        self.max_wait = 0.0
+
+    def run_worker(self, tasks):
+        while (task := tasks.get()) is not None:
+            (function, group) = task
+            try:
+                function(group)
+                self._done.put(None)
+            except Exception as e:
+                self._done.put(e)
+
+    def should_split(self, num_voices, num_frames):
+        return self.num_threads > 1 and num_voices > 1 and num_voices * num_frames >= self.min_frames_per_thread * self.num_threads
+
+    def map(self, function, items, deadline=None):
+        """
+        Split items into num_threads interleaved groups and call function(group) for every group, one group per thread.
+        Returns once every group is done, even if the caller's own group raised, so no worker is still
+        rendering voices when the exception propagates. deadline is in seconds from now.
+        """
+        groups = [items[i::self.num_threads] for i in range(self.num_threads)]
+        start = perf_counter()
+        dispatched = 0
+        for (tasks, group) in zip(self._tasks, groups[1:]):
+            if group:
+                tasks.put((function, group))
+                dispatched += 1
+        self.dispatches += 1
+
+        errors = []
+        try:
+            function(groups[0])
+        finally:
+            wait_start = perf_counter()
+            for _ in range(dispatched):
+                timeout = None if deadline is None else max(start + deadline - perf_counter(), 0.0)
+                try:
+                    result = self._done.get(timeout=timeout)
+                except queue.Empty:
+                    self.missed_deadlines += 1
+                    deadline = None # the voices have to finish anyway, so wait for the rest without a deadline
+                    result = self._done.get()
+                if result is not None:
+                    errors.append(result)
+            self.max_wait = max(self.max_wait, perf_counter() - wait_start)
+        if errors:
+            raise errors[0]
+
+    def stats(self):
+        return {
+            "threads": self.num_threads,
+            "dispatches": self.dispatches,
+            "missed_deadlines": self.missed_deadlines,
+            "max_wait_ms": round(1000 * self.max_wait, 3),
+        }
+
+    def close(self):
+        for tasks in self._tasks:
+            tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []